@@ -1,35 +1,44 @@
 # app.py
 
+from typing import List, Literal, Optional
+
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from core.prepare import prepare_documents, build_index
-from core.query import query_answer, init_chat_engine, chat_turn, keyword_based_answer, suggest_recipes_by_ingredients, find_similar_recipes
+from core.storage import load_or_build_index
+from core.query import (query_answer, init_chat_engines, chat_turn, keyword_based_answer, suggest_recipes_by_ingredients,
+                        stream_query_answer, stream_chat_turn,
+                        suggest_recipes_by_query, find_similar_recipes, suggest_recipes_by_queries,
+                        suggest_recipes_by_ingredient_sets, find_similar_recipes_batch)
 from core.utils import get_keywords_from_llama, scale_ingredients
 from core.embedding import get_embed_model
+from core.answer_cache import get_answer_cache
+from core.engines import RETRIEVAL_MODES
+from core.name_index import get_name_index
+from core.recipes import get_recipe_store
+from core.streaming import SSE_MEDIA_TYPE, describe_sources, sse_stream
 
 import nest_asyncio
-import json
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
 
 # --- 初始化部分 ---
 nest_asyncio.apply()
 
-# 载入数据
-with open("sample.json", 'r', encoding='utf-8') as f:
-    recipe_data = json.load(f)
-
 # 设置模型
 Settings.llm = Ollama(model="tinyllama:1.1b", request_timeout=600.0)
 Settings.embed_model = get_embed_model("nomic-embed-text")
 Settings.chunk_size = 1024
 
-# 准备索引
-documents = prepare_documents(recipe_data)
-index = build_index(documents)
+# 准备索引（优先加载持久化索引，数据或模型变化时才重建）
+index = load_or_build_index("sample.json", persist_dir="./data/sample_index_storage")
 
-# 准备多轮聊天引擎
-chat_engine = init_chat_engine(index)
+# 语义答案缓存：相似度达到阈值的问题直接返回已有答案，条目保留一天
+for retrieval in RETRIEVAL_MODES:
+    get_answer_cache(index, retrieval, threshold=0.92, max_entries=1000, ttl=24 * 3600)
+
+# 准备多轮聊天引擎（向量检索 / 混合检索各一个，共用对话记忆）
+chat_engines = init_chat_engines(index)
 
 # --- FastAPI 应用 ---
 app = FastAPI()
@@ -37,6 +46,8 @@ app = FastAPI()
 # --- 请求体 ---
 class QueryRequest(BaseModel):
     query: str
+    # vector: 纯向量检索；hybrid: 向量 + BM25 倒数排名融合
+    retrieval: Literal["vector", "hybrid"] = "vector"
 
 class IngredientsRequest(BaseModel):
     ingredients: list
@@ -45,21 +56,58 @@ class ScaleRequest(BaseModel):
     ingredients: list
     scale_by: float
 
+# --- 批量请求体：结果与输入顺序一致 ---
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+
+class BatchIngredientsRequest(BaseModel):
+    ingredient_sets: List[List[str]]
+
+class BatchSimilarRequest(BaseModel):
+    names: List[str]
+    top_k: int = 3
+
+class BatchScaleItem(BaseModel):
+    # 直接给出配料，或给出菜谱名从记录表中取配料
+    ingredients: Optional[list] = None
+    recipe_name: Optional[str] = None
+    scale_by: float
+
+class BatchScaleRequest(BaseModel):
+    items: List[BatchScaleItem]
+
 # --- API 路由 ---
 
 @app.post("/query")
 def query_recipe(req: QueryRequest):
-    result = query_answer(req.query, index)
+    result = query_answer(req.query, index, retrieval=req.retrieval)
     return {"answer": result}
 
+# 流式版本：Server-Sent Events，先逐个发送 token 事件，最后的 done 事件带上 intent 和 sources
+@app.post("/query/stream")
+def query_recipe_stream(req: QueryRequest):
+    tokens, sources = stream_query_answer(req.query, index, retrieval=req.retrieval)
+    final = {"intent": "query", "sources": describe_sources(sources)}
+    return StreamingResponse(sse_stream(tokens, final), media_type=SSE_MEDIA_TYPE)
+
+@app.get("/cache_stats")
+def cache_stats():
+    return {"answer_cache": {retrieval: get_answer_cache(index, retrieval).stats() for retrieval in RETRIEVAL_MODES}}
+
 @app.post("/chat")
 def chat_recipe(req: QueryRequest):
-    result = chat_turn(req.query, chat_engine)
+    result = chat_turn(req.query, chat_engines[req.retrieval])
     return {"answer": result}
 
+@app.post("/chat/stream")
+def chat_recipe_stream(req: QueryRequest):
+    tokens, sources = stream_chat_turn(req.query, chat_engines[req.retrieval])
+    final = {"intent": "chat", "sources": describe_sources(sources)}
+    return StreamingResponse(sse_stream(tokens, final), media_type=SSE_MEDIA_TYPE)
+
 @app.post("/keyword_search")
 def keyword_search_recipe(req: QueryRequest):
-    result = keyword_based_answer(req.query, index, get_keywords_from_llama)
+    result = keyword_based_answer(req.query, index, get_keywords_from_llama, retrieval=req.retrieval)
     return {"answer": result}
 
 @app.post("/suggest")
@@ -70,9 +118,38 @@ def suggest_recipe_from_query(req: QueryRequest):
 @app.post("/similar")
 def similar_recipe(req: QueryRequest):
     result = find_similar_recipes(req.query, index, Settings.embed_model)
-    return {"similar_recipes": result}
+    return {"similar_recipes": result, "name_matches": get_name_index(index).resolve(req.query)}
+
+@app.post("/resolve_name")
+def resolve_recipe_name(req: QueryRequest):
+    return {"matches": get_name_index(index).resolve(req.query)}
 
 @app.post("/scale")
 def scale_recipe(req: ScaleRequest):
     scaled = scale_ingredients(req.ingredients, req.scale_by)
     return {"scaled_ingredients": scaled}
+
+@app.post("/suggest/batch")
+def suggest_recipes_batch(req: BatchQueryRequest):
+    return {"suggestions": suggest_recipes_by_queries(req.queries, index)}
+
+@app.post("/suggest_by_ingredients/batch")
+def suggest_by_ingredients_batch(req: BatchIngredientsRequest):
+    return {"suggestions": suggest_recipes_by_ingredient_sets(req.ingredient_sets, index)}
+
+@app.post("/similar/batch")
+def similar_recipes_batch(req: BatchSimilarRequest):
+    return {"similar_recipes": find_similar_recipes_batch(req.names, index, top_k=req.top_k)}
+
+@app.post("/scale/batch")
+def scale_recipes_batch(req: BatchScaleRequest):
+    # 按菜谱名给出的条目先解析菜名，再从记录表一次性取出所有配料；找不到菜谱的条目结果为 null
+    name_index = get_name_index(index)
+    names = [name_index.best(item.recipe_name) if item.ingredients is None and item.recipe_name else None
+             for item in req.items]
+    records = get_recipe_store(index).get_many([name for name in names if name])
+    scaled = []
+    for item, name in zip(req.items, names):
+        ingredients = item.ingredients if item.ingredients is not None else (records.get(name) or {}).get("ingredients")
+        scaled.append(scale_ingredients(ingredients, item.scale_by) if ingredients is not None else None)
+    return {"scaled_ingredients": scaled}
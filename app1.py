@@ -4,31 +4,30 @@ from typing import Optional, List
 import re
 
 import nest_asyncio
-import json
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
-from core.prepare import prepare_documents, build_index
+from core.storage import load_or_build_index
 from core.query import query_answer, init_chat_engine, chat_turn, keyword_based_answer, suggest_recipes_by_ingredients, find_similar_recipes
+from core.query import stream_query_answer, stream_chat_turn
+from core.streaming import SSE_MEDIA_TYPE, describe_sources, sse_stream
 from core.utils import get_keywords_from_llama, scale_ingredients
 from core.embedding import get_embed_model
+from core.llm_cache import cached_complete
+from core.intent import IntentClassifier, SCALE_CUES, SIMILAR_CUES, cue_target, scale_factor
 from fastapi import FastAPI 
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # --- 初始化部分 ---
 nest_asyncio.apply()
 
-# 载入数据
-with open("sample.json", 'r', encoding='utf-8') as f:
-    recipe_data = json.load(f)
-
 # 设置模型
 Settings.llm = Ollama(model="tinyllama:1.1b", request_timeout=600.0)
 Settings.embed_model = get_embed_model("nomic-embed-text")
 Settings.chunk_size = 1024
 
-# 准备索引
-documents = prepare_documents(recipe_data)
-index = build_index(documents)
+# 准备索引（优先加载持久化索引，数据或模型变化时才重建）
+index = load_or_build_index("sample.json", persist_dir="./data/sample_index_storage")
 
 # 准备多轮聊天引擎
 chat_engine = init_chat_engine(index)
@@ -47,10 +46,57 @@ intent_prompt = PromptTemplate("""
 用户输入: {user_input}
 意图:""")
 
-def detect_intent(user_input: str) -> str:
+# 本地意图分类：嵌入原型 + 关键词提示，置信度低于阈值时才请 LLM 判断
+INTENT_THRESHOLD = 0.6
+intent_classifier = IntentClassifier(
+    examples={
+        "suggest": [
+            "我有土豆和牛肉能做什么菜",
+            "冰箱里有鸡蛋和西红柿，推荐个菜",
+            "用鸡肉和土豆可以做什么",
+            "What can I cook with chicken and potatoes?",
+        ],
+        "scale": [
+            "把份量减半",
+            "这个菜谱加倍",
+            "改成6人份",
+            "Change the recipe for 12 people instead of 4.",
+        ],
+        "similar": [
+            "有没有类似宫保鸡丁的菜",
+            "和红烧肉相似的食谱",
+            "Show me dishes similar to Kung Pao Chicken.",
+        ],
+        "query": [
+            "红烧肉怎么做",
+            "做蛋糕需要哪些材料",
+            "牛排要煎多久",
+            "这道菜是几人份的",
+            "How do I make Chana Masala?",
+        ],
+        "chat": [
+            "你好",
+            "谢谢你的建议",
+            "汉堡是谁发明的",
+            "Who invented the hamburger?",
+            "Is baking similar to roasting?",
+        ],
+    },
+    cues={"similar": SIMILAR_CUES, "scale": SCALE_CUES},
+)
+
+
+def detect_intent_llm(user_input: str) -> str:
     """使用LLM判断用户意图"""
-    response = Settings.llm.complete(intent_prompt.format(user_input=user_input))
-    return response.text.strip().lower()
+    response = cached_complete(intent_prompt.format(user_input=user_input), llm=Settings.llm)
+    return response.lower()
+
+def detect_intent(user_input: str) -> str:
+    """先用本地分类器判断用户意图，置信度不足时再用LLM"""
+    intent, confidence = intent_classifier.classify(user_input)
+    if confidence >= INTENT_THRESHOLD:
+        return intent
+    return detect_intent_llm(user_input)
 
 def extract_ingredients(text: str) -> List[str]:
     """从用户输入中提取食材"""
@@ -69,15 +115,8 @@ def extract_ingredients(text: str) -> List[str]:
 
 def extract_scale_factor(text: str) -> float:
     """从用户输入中提取调整比例"""
-    # 提取数字比例
-    numbers = re.findall(r'(\d+\.?\d*)', text)
-    if "减半" in text or "一半" in text:
-        return 0.5
-    elif "加倍" in text or "两倍" in text:
-        return 2.0
-    elif numbers:
-        return float(numbers[0])
-    return 1.0  # 默认不调整
+    factor = scale_factor(text)
+    return factor if factor is not None else 1.0  # 默认不调整
 
 # 添加统一请求体
 class UnifiedRequest(BaseModel):
@@ -91,6 +130,26 @@ async def unified_query(req: UnifiedRequest):
     intent = detect_intent(req.query)
     
     # 2. 根据意图处理请求
+    return handle_intent(intent, req)
+
+# 流式统一端点（Server-Sent Events）：query / chat 意图逐个发送 token 事件，
+# 其余意图结果不经过 LLM 生成，直接放在最后的 done 事件中；done 事件总是带上 intent 和 sources
+# 意图判断、检索和非流式意图的处理都是阻塞调用，用普通函数让 FastAPI 放到线程池执行，不阻塞事件循环
+@app.post("/unified_query/stream")
+def unified_query_stream(req: UnifiedRequest):
+    intent = detect_intent(req.query)
+    if intent == "query":
+        tokens, sources = stream_query_answer(req.query, index)
+    elif intent in ("suggest", "scale", "similar", "keywords"):
+        return StreamingResponse(sse_stream([], {"intent": intent, **handle_intent(intent, req), "sources": []}),
+                                 media_type=SSE_MEDIA_TYPE)
+    else:
+        intent = "chat"
+        tokens, sources = stream_chat_turn(req.query, chat_engine)
+    final = {"intent": intent, "sources": describe_sources(sources)}
+    return StreamingResponse(sse_stream(tokens, final), media_type=SSE_MEDIA_TYPE)
+
+def handle_intent(intent: str, req: UnifiedRequest) -> dict:
     if intent == "suggest":
         ingredients = extract_ingredients(req.query)
         if not ingredients:
@@ -106,7 +165,7 @@ async def unified_query(req: UnifiedRequest):
         return {"intent": "scale", "result": scaled}
     
     elif intent == "similar":
-        result = find_similar_recipes(req.query, index, Settings.embed_model)
+        result = find_similar_recipes(cue_target(req.query) or req.query, index, Settings.embed_model)
         return {"intent": "similar", "result": result}
     
     elif intent == "query":
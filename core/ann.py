@@ -0,0 +1,119 @@
+# core/ann.py
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似最近邻索引：用球面 k-means 把向量分到 nlist 个簇，
+    查询时只在与查询最接近的 nprobe 个簇里精确打分。
+
+    nprobe 越大召回越高、延迟越高；nprobe == nlist 时等价于暴力搜索。
+    索引只保存簇中心和每一行所属的簇，向量本身仍由调用方（MmapVectorStore）持有。
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._postings: Optional[List[np.ndarray]] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, matrix: np.ndarray, n_iter: int = 20, max_train_rows: int = 50_000,
+              chunk_size: int = 8192) -> "IVFIndex":
+        n = matrix.shape[0]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+        sample_rows = rng.choice(n, size=min(n, max_train_rows), replace=False)
+        sample = _normalize(matrix[np.sort(sample_rows)])
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = self._assign(sample, centroids, chunk_size)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新随机选点作为中心
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.assignments = self._assign(_normalize(matrix), centroids, chunk_size)
+        self._postings = None
+        return self
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            block = vectors[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def add(self, vectors: np.ndarray) -> None:
+        """追加新行（行号紧接在已有行之后），分配到最近的簇，无需重新训练"""
+        if len(vectors) == 0:
+            return
+        labels = self._assign(_normalize(vectors), self.centroids)
+        self.assignments = np.concatenate([self.assignments, labels])
+        self._postings = None
+
+    def keep_rows(self, keep: np.ndarray) -> None:
+        """与向量矩阵同步删除行，剩余行按原顺序重新编号"""
+        self.assignments = self.assignments[keep]
+        self._postings = None
+
+    @property
+    def postings(self) -> List[np.ndarray]:
+        if self._postings is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            self._postings = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        return self._postings
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        sims = self.centroids @ _normalize(query)
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        postings = self.postings
+        return np.sort(np.concatenate([postings[p] for p in probe]))
+
+    def search(self, matrix: np.ndarray, norms: np.ndarray, query: np.ndarray, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self.candidates(query, nprobe)
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+        q = np.asarray(query, dtype=np.float32)
+        scores = (matrix[rows] @ q) / np.maximum(norms[rows] * np.linalg.norm(q), 1e-12)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def save(self, path: str) -> None:
+        np.savez(path, centroids=self.centroids, assignments=self.assignments,
+                 params=np.array([self.nlist, self.nprobe, self.seed], dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            nlist, nprobe, seed = (int(v) for v in data["params"])
+            index = cls(nlist=nlist, nprobe=nprobe, seed=seed)
+            index.centroids = data["centroids"]
+            index.assignments = data["assignments"]
+        return index
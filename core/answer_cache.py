@@ -0,0 +1,113 @@
+# core/answer_cache.py
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.engines import RETRIEVAL_MODES
+from core.registry import attached
+
+
+class SemanticAnswerCache:
+    """语义答案缓存：查询向量与已缓存查询的余弦相似度达到 threshold 即直接返回缓存的答案。
+
+    向量保存在预分配的归一化 float32 矩阵中，一次矩阵-向量乘法完成查找；
+    条目超过 ttl 秒过期，满 max_entries 条时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1000, ttl: Optional[float] = 24 * 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._entries: List[Optional[Tuple[str, object]]] = [None] * max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is not None:
+            expired = self._valid & (now - self._created > self.ttl)
+            if expired.any():
+                self._valid[expired] = False
+                for slot in np.flatnonzero(expired):
+                    self._entries[slot] = None
+
+    def lookup(self, embedding) -> Optional[object]:
+        """返回命中的答案；未命中返回 None"""
+        q = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if self._vectors is not None and self._valid.any() and self._vectors.shape[1] == q.shape[0]:
+                scores = np.where(self._valid, self._vectors @ q, -np.inf)
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._entries[slot][1]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding, answer) -> None:
+        q = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                # 第一次写入（或嵌入维度变化）时按维度分配矩阵
+                self._vectors = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries = [None] * self.max_entries
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[slot] = q
+            self._valid[slot] = True
+            self._created[slot] = self._last_used[slot] = now
+            self._entries[slot] = (query, answer)
+
+    def clear(self) -> None:
+        """重新索引后调用：旧答案可能引用已变化的菜谱，全部作废"""
+        with self._lock:
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# 每个 VectorStoreIndex 每种检索方式一份答案缓存：同一问题在不同检索方式下的答案不能互相复用；
+# 重新加载或重建索引得到新对象，缓存自然失效
+def get_answer_cache(index, retrieval: str = "vector", **kwargs) -> SemanticAnswerCache:
+    """取索引在该检索方式下的答案缓存；第一次调用时用 kwargs（threshold / max_entries / ttl）创建"""
+    return attached(index, ("answer_cache", retrieval), lambda: SemanticAnswerCache(**kwargs))
+
+
+def invalidate_answer_cache(index) -> None:
+    for retrieval in RETRIEVAL_MODES:
+        cache = attached(index, ("answer_cache", retrieval))
+        if cache is not None:
+            cache.clear()
@@ -0,0 +1,132 @@
+# core/bm25.py
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from core.docstore import iter_docstore_nodes
+from core.extractors import count_matrix, tokenize
+from core.registry import attach, attached, detach
+
+BM25_INDEX_FILE = "bm25_index.npz"
+
+
+class BM25Index:
+    """节点文本上的 BM25 稀疏索引。
+
+    建索引时把每个 (节点, 词) 的 BM25 权重（idf 与词频饱和、长度归一化项之积）一次算好，
+    存成按列压缩的稀疏矩阵；查询时取出查询词对应的几列做一次稀疏矩阵-向量乘法即得到全部节点的得分。
+    """
+
+    def __init__(self, node_ids: Sequence[str], terms: Sequence[str], weights: sparse.csc_matrix):
+        self.node_ids = list(node_ids)
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.weights = weights.tocsc()
+        self._rows = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, node_ids: Sequence[str], texts: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        counts = count_matrix(texts, vocab, grow=True)
+        n_docs = counts.shape[0]
+        doc_len = np.asarray(counts.sum(axis=1)).ravel()
+        avg_len = max(float(doc_len.mean()), 1.0) if n_docs else 1.0
+        df = np.bincount(counts.indices, minlength=len(vocab)).astype(np.float32)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        tf = counts.data
+        rows = np.repeat(np.arange(n_docs), np.diff(counts.indptr))
+        norm = k1 * (1.0 - b + b * doc_len[rows] / avg_len)
+        weights = counts.copy()
+        weights.data = (idf[counts.indices] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        terms = np.empty(len(vocab), dtype=object)
+        terms[list(vocab.values())] = list(vocab.keys())
+        return cls(node_ids, terms.tolist(), weights.tocsc())
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable, **kwargs) -> "BM25Index":
+        node_ids, texts = [], []
+        for node in nodes:
+            node_ids.append(node.node_id)
+            texts.append(node.get_content())
+        return cls.build(node_ids, texts, **kwargs)
+
+    @classmethod
+    def from_docstore(cls, docstore, **kwargs) -> "BM25Index":
+        return cls.from_nodes(iter_docstore_nodes(docstore), **kwargs)
+
+    def scores(self, query: str) -> np.ndarray:
+        """所有节点对查询的 BM25 得分，顺序同 self.node_ids"""
+        cols = [self.vocab[t] for t in tokenize(query) if t in self.vocab]
+        if not cols:
+            return np.zeros(len(self.node_ids), dtype=np.float32)
+        cols, query_tf = np.unique(cols, return_counts=True)
+        return self.weights[:, cols] @ query_tf.astype(np.float32)
+
+    def search(self, query: str, top_k: int = 10,
+               node_ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """得分最高的 top_k 个 (节点 id, 得分)，只返回得分大于 0 的节点；node_ids 给出时只在这些节点中排序"""
+        scores = self.scores(query)
+        if node_ids is not None:
+            rows = np.array([self._rows[i] for i in node_ids if i in self._rows], dtype=np.int64)
+        else:
+            rows = np.arange(len(self.node_ids))
+        rows = rows[scores[rows] > 0]
+        if len(rows) > top_k:
+            rows = rows[np.argpartition(-scores[rows], top_k)[:top_k]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.node_ids[r], float(scores[r])) for r in rows]
+
+    def save(self, path: str) -> None:
+        np.savez(path, node_ids=np.array(self.node_ids, dtype=str),
+                 terms=np.array(sorted(self.vocab, key=self.vocab.get), dtype=str),
+                 data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                 shape=np.array(self.weights.shape))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            weights = sparse.csc_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+            return cls(data["node_ids"].tolist(), data["terms"].tolist(), weights)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> Optional["BM25Index"]:
+        path = os.path.join(persist_dir, BM25_INDEX_FILE)
+        return cls.load(path) if os.path.exists(path) else None
+
+
+def attach_bm25_index(index, bm25_index: BM25Index) -> None:
+    attach(index, "bm25_index", bm25_index)
+
+
+def get_bm25_index(index) -> BM25Index:
+    """取索引对应的 BM25 索引；未随索引加载（或增量更新后已作废）时从 docstore 构建一次并缓存"""
+    return attached(index, "bm25_index", lambda: BM25Index.from_docstore(index.storage_context.docstore))
+
+
+def invalidate_bm25_index(index) -> None:
+    # idf 与平均长度依赖整个语料，节点增删后整体重建
+    detach(index, "bm25_index")
+
+
+class BM25Retriever(BaseRetriever):
+    """按 BM25 得分检索节点；每次检索时取索引当前的 BM25 索引，增量更新后自动使用重建的版本"""
+
+    def __init__(self, index, similarity_top_k: int = 10, node_ids: Optional[Sequence[str]] = None):
+        super().__init__(callback_manager=index._callback_manager)
+        self.index = index
+        self.similarity_top_k = similarity_top_k
+        self.node_ids = node_ids
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        hits = get_bm25_index(self.index).search(query_bundle.query_str, self.similarity_top_k, self.node_ids)
+        if not hits:
+            return []
+        nodes = self.index.docstore.get_nodes([node_id for node_id, _ in hits])
+        return [NodeWithScore(node=node, score=score) for node, (_, score) in zip(nodes, hits)]
@@ -0,0 +1,158 @@
+# core/docstore.py
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.kvstore.types import DEFAULT_BATCH_SIZE, DEFAULT_COLLECTION, BaseKVStore
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+class SqliteKVStore(BaseKVStore):
+    """单文件 SQLite 键值存储，值按需读取不常驻内存"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (collection, key))"
+        )
+        self._conn.commit()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    def put_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        rows = [(collection, key, json.dumps(val, ensure_ascii=False)) for key, val in kv_pairs]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    async def aput_all(self, kv_pairs: List[Tuple[str, dict]], collection: str = DEFAULT_COLLECTION,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.put_all(kv_pairs, collection, batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    def get_many(self, keys: List[str], collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM kv WHERE collection = ? AND key IN ({','.join('?' * len(batch))})",
+                    [collection, *batch],
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return dict(self.iter_all(collection))
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    def iter_all(self, collection: str = DEFAULT_COLLECTION, batch_size: int = 500) -> Iterator[Tuple[str, dict]]:
+        """按主键分页流式读取整个集合"""
+        last_key = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, value FROM kv WHERE collection = ? AND key > ? ORDER BY key LIMIT ?",
+                    (collection, last_key, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for key, value in rows:
+                yield key, json.loads(value)
+            last_key = rows[-1][0]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def backup(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        target = sqlite3.connect(path)
+        with self._lock:
+            self._conn.backup(target)
+        target.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv")
+            self._conn.commit()
+
+
+class SqliteDocumentStore(KVDocumentStore):
+    """基于 SQLite 的 docstore：常驻内存的只有连接本身，节点文本按 id 或菜谱名按需读取"""
+
+    def __init__(self, kvstore: SqliteKVStore, **kwargs):
+        super().__init__(kvstore, **kwargs)
+        self._sqlite = kvstore
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, reset: bool = False) -> "SqliteDocumentStore":
+        kvstore = SqliteKVStore(os.path.join(persist_dir, DOCSTORE_FILE))
+        if reset:
+            kvstore.clear()
+        return cls(kvstore)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, DOCSTORE_FILE))
+
+    def persist(self, persist_path: Optional[str] = None, fs=None) -> None:
+        # 每次写入都已提交，SQLite 文件本身就是持久化结果；只有保存到其他目录时才需要复制一份
+        if persist_path is None:
+            return
+        target = os.path.join(os.path.dirname(persist_path) or ".", DOCSTORE_FILE)
+        if os.path.abspath(target) != os.path.abspath(self._sqlite.path):
+            self._sqlite.backup(target)
+
+    def get_nodes(self, node_ids: List[str], raise_error: bool = True) -> List[BaseNode]:
+        found = self._sqlite.get_many(list(node_ids), collection=self._node_collection)
+        if raise_error:
+            missing = [node_id for node_id in node_ids if node_id not in found]
+            if missing:
+                raise ValueError(f"doc_id {missing[0]} not found.")
+        return [json_to_doc(found[node_id]) for node_id in node_ids if node_id in found]
+
+    def iter_nodes(self, batch_size: int = 500) -> Iterator[BaseNode]:
+        for _, data in self._sqlite.iter_all(self._node_collection, batch_size=batch_size):
+            yield json_to_doc(data)
+
+
+def iter_docstore_nodes(docstore) -> Iterator[BaseNode]:
+    """遍历 docstore 中的节点：SQLite docstore 分页流式读取，默认 docstore 退回到内存字典"""
+    if hasattr(docstore, "iter_nodes"):
+        return docstore.iter_nodes()
+    return iter(docstore.docs.values())
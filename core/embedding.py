@@ -1,5 +1,188 @@
 # core/embedding.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.embeddings.ollama import OllamaEmbedding
 
-def get_embed_model(model_name: str = "nomic-embed-text"):
-    return OllamaEmbedding(model_name=model_name)
+DEFAULT_CACHE_PATH = "./data/embedding_cache.sqlite"
+
+
+class EmbeddingCache:
+    """按 (模型名, 文本哈希) 持久化嵌入向量，向量以 float32 二进制存储，超出容量时按 LRU 淘汰。
+
+    last_used 只在距上次记录超过 touch_interval 秒时才更新，LRU 的时间精度因此为 touch_interval。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 200_000, touch_interval: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 分片构建时多个进程共享同一个缓存文件，写锁冲突时等待而不是立即报错
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # 条目数在内存中累加，不在每次写入时 COUNT(*)；多个进程共享缓存文件时会有偏差，定期按实际行数校正
+        self._count = 0
+        self._sync_count()
+
+    def _sync_count(self) -> None:
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._inserted_since_sync = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        stale = []
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分批查询
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = array('f', blob).tolist()
+                    if last_used < now - self.touch_interval:
+                        stale.append(key)
+            # 命中频繁的条目不必每次都写回访问时间
+            if stale:
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in stale])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[bytes, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            # 同一 (模型, 文本) 的向量不会变化，已存在的键直接跳过，rowcount 即为新增条目数
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(k, array('f', v).tobytes(), now) for k, v in items.items()],
+            ).rowcount
+            self._count += inserted
+            self._inserted_since_sync += inserted
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self._count <= self.max_entries and self._inserted_since_sync < self.max_entries // 10:
+            return
+        self._sync_count()
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (overflow,)
+            )
+            self._count -= overflow
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """在任意嵌入模型外包一层持久化缓存，命中时跳过对嵌入服务的请求"""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingCache, **kwargs):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _lookup(self, texts: List[str]):
+        keys = [EmbeddingCache.make_key(self.model_name, t) for t in texts]
+        found = self._cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        return keys, found, missing
+
+    def _merge(self, keys: List[bytes], found: Dict, missing: List[str], embeddings: List) -> List[List[float]]:
+        new_items = {EmbeddingCache.make_key(self.model_name, t): e for t, e in zip(missing, embeddings)}
+        self._cache.put_many(new_items)
+        found.update(new_items)
+        return [found[k] for k in keys]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        embeddings = self._inner._get_text_embeddings(missing) if missing else []
+        return self._merge(keys, found, missing, embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        embeddings = await self._inner._aget_text_embeddings(missing) if missing else []
+        return self._merge(keys, found, missing, embeddings)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        keys, found, missing = self._lookup([query])
+        embeddings = [self._inner._get_query_embedding(query)] if missing else []
+        return self._merge(keys, found, missing, embeddings)[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        keys, found, missing = self._lookup([query])
+        embeddings = [await self._inner._aget_query_embedding(query)] if missing else []
+        return self._merge(keys, found, missing, embeddings)[0]
+
+
+def get_embed_model(model_name: str = "nomic-embed-text", cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                    max_cache_entries: int = 200_000, base_url: str = "http://localhost:11434"):
+    embed_model = OllamaEmbedding(model_name=model_name, base_url=base_url)
+    if cache_path is None:
+        return embed_model
+    return CachedEmbedding(embed_model, EmbeddingCache(cache_path, max_entries=max_cache_entries))
@@ -0,0 +1,175 @@
+# core/engines.py
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from llama_index.core import Settings, get_response_synthesizer
+from llama_index.core.constants import DEFAULT_SIMILARITY_TOP_K
+from llama_index.core.indices.vector_store.retrievers import VectorIndexRetriever
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.response_synthesizers import BaseSynthesizer
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
+
+from core.bm25 import BM25Retriever
+from core.registry import attached
+
+# 长期复用的检索器 / 合成器 / 查询引擎，按配置缓存，所有请求共享。
+# 这些对象在查询时不修改自身状态，可以被并发请求同时使用。
+
+_LOCK = threading.RLock()
+# 每个索引一组 {配置: 对象}，通过 core.registry 挂在索引对象上，键以 "engine" 开头
+# 合成器与索引无关，按 (response_mode, streaming, llm) 共享
+_SYNTHESIZERS: Dict[Tuple[str, bool, int], BaseSynthesizer] = {}
+
+# retrieval: "vector" 为纯向量检索，"hybrid" 为向量 + BM25 倒数排名融合
+RETRIEVAL_MODES = ("vector", "hybrid")
+# 融合权重按 (向量, BM25) 顺序
+DEFAULT_FUSION_WEIGHTS = (1.0, 1.0)
+DEFAULT_RRF_K = 60
+
+
+def _cached(index, key: Hashable, factory):
+    return attached(index, ("engine", key), factory)
+
+
+def get_synthesizer(response_mode: str = "compact", streaming: bool = False) -> BaseSynthesizer:
+    """响应合成器（含编译好的提示模板），同一 response_mode、streaming 和 LLM 只构建一次"""
+    key = (response_mode, streaming, id(Settings.llm))
+    with _LOCK:
+        synthesizer = _SYNTHESIZERS.get(key)
+        if synthesizer is None:
+            synthesizer = _SYNTHESIZERS[key] = get_response_synthesizer(response_mode=response_mode,
+                                                                        streaming=streaming)
+        return synthesizer
+
+
+def make_retriever(index, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+                   filters: Optional[MetadataFilters] = None,
+                   node_ids: Optional[List[str]] = None) -> VectorIndexRetriever:
+    # index.as_retriever() 每次都会把全部节点 id 复制成列表并作为候选传给向量存储，
+    # 这里不传 node_ids，直接在整个向量存储上检索（mmap 存储也因此可以走 IVF 近似检索）
+    return VectorIndexRetriever(index, similarity_top_k=similarity_top_k, filters=filters, node_ids=node_ids,
+                                callback_manager=index._callback_manager, object_map=index._object_map)
+
+
+class FusionRetriever(BaseRetriever):
+    """倒数排名融合（RRF）：节点得分为 sum(weight / (rrf_k + 排名))，只用各检索器的排名，不依赖得分尺度"""
+
+    def __init__(self, retrievers: Sequence[BaseRetriever], weights: Optional[Sequence[float]] = None,
+                 rrf_k: int = DEFAULT_RRF_K, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K):
+        super().__init__()
+        self.retrievers = list(retrievers)
+        self.weights = list(weights) if weights is not None else [1.0] * len(self.retrievers)
+        if len(self.weights) != len(self.retrievers):
+            raise ValueError("weights must match retrievers")
+        self.rrf_k = rrf_k
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        fused: Dict[str, float] = defaultdict(float)
+        nodes = {}
+        for retriever, weight in zip(self.retrievers, self.weights):
+            if weight <= 0:
+                continue
+            for rank, result in enumerate(retriever.retrieve(query_bundle), start=1):
+                node_id = result.node.node_id
+                fused[node_id] += weight / (self.rrf_k + rank)
+                nodes.setdefault(node_id, result.node)
+        ranked = sorted(fused.items(), key=lambda item: -item[1])[:self.similarity_top_k]
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in ranked]
+
+
+def make_hybrid_retriever(index, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+                          weights: Sequence[float] = DEFAULT_FUSION_WEIGHTS, rrf_k: int = DEFAULT_RRF_K,
+                          node_ids: Optional[List[str]] = None,
+                          candidate_top_k: Optional[int] = None) -> FusionRetriever:
+    # 两路各取 candidate_top_k 个候选再融合，默认为最终结果数的 4 倍
+    candidate_top_k = candidate_top_k or max(similarity_top_k * 4, 20)
+    return FusionRetriever(
+        [make_retriever(index, candidate_top_k, node_ids=node_ids), BM25Retriever(index, candidate_top_k, node_ids)],
+        weights=weights, rrf_k=rrf_k, similarity_top_k=similarity_top_k,
+    )
+
+
+def get_retriever(index, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K, retrieval: str = "vector",
+                  weights: Sequence[float] = DEFAULT_FUSION_WEIGHTS, rrf_k: int = DEFAULT_RRF_K) -> BaseRetriever:
+    if retrieval == "vector":
+        return _cached(index, ("retriever", similarity_top_k), lambda: make_retriever(index, similarity_top_k))
+    if retrieval == "hybrid":
+        return _cached(index, ("hybrid", similarity_top_k, tuple(weights), rrf_k),
+                       lambda: make_hybrid_retriever(index, similarity_top_k, weights, rrf_k))
+    raise ValueError(f"Unknown retrieval: {retrieval}")
+
+
+def get_query_engine(index, similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+                     response_mode: str = "compact", retrieval: str = "vector",
+                     weights: Sequence[float] = DEFAULT_FUSION_WEIGHTS, streaming: bool = False) -> RetrieverQueryEngine:
+    """按 (top_k, response_mode, retrieval, streaming) 复用的查询引擎；retrieval="vector" 时等价于 index.as_query_engine(...)。
+    streaming=True 时 query() 返回 StreamingResponse，答案通过 response_gen 逐段产出"""
+    return _cached(
+        index, ("query", similarity_top_k, response_mode, id(Settings.llm), retrieval, tuple(weights), streaming),
+        lambda: RetrieverQueryEngine(retriever=get_retriever(index, similarity_top_k, retrieval, weights),
+                                     response_synthesizer=get_synthesizer(response_mode, streaming)),
+    )
+
+
+class FilteredQueryEngine:
+    """过滤模板：固定元数据字段、运算符和组合条件，每次查询只传入过滤值。
+
+    过滤值随请求变化，检索器按请求构建（只是一个轻量对象），合成器和提示模板共享。
+    给出 candidate_index（如关键词倒排索引）时不再逐节点匹配元数据，
+    而是先把过滤值解析成候选节点 id，向量检索只在候选节点上进行。
+    """
+
+    def __init__(self, index, filter_key: str, operator: str = "contains", condition: str = "and",
+                 similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K, response_mode: str = "compact",
+                 candidate_index=None, retrieval: str = "vector"):
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval: {retrieval}")
+        if retrieval == "hybrid" and candidate_index is None:
+            raise ValueError("hybrid retrieval requires a candidate_index")
+        self.index = index
+        self.filter_key = filter_key
+        self.operator = operator
+        self.condition = condition
+        self.similarity_top_k = similarity_top_k
+        self.synthesizer = get_synthesizer(response_mode)
+        self.candidate_index = candidate_index
+        self.retrieval = retrieval
+
+    def make_filters(self, values: Sequence[str]) -> MetadataFilters:
+        return MetadataFilters(
+            filters=[MetadataFilter(key=self.filter_key, value=v, operator=self.operator) for v in values],
+            condition=self.condition,
+        )
+
+    def retrieve(self, query: str, values: Sequence[str]):
+        if self.candidate_index is not None:
+            node_ids = self.candidate_index.candidates(values, self.condition)
+            if not node_ids:
+                return []
+            if self.retrieval == "hybrid":
+                retriever = make_hybrid_retriever(self.index, self.similarity_top_k, node_ids=node_ids)
+            else:
+                retriever = make_retriever(self.index, self.similarity_top_k, node_ids=node_ids)
+        else:
+            retriever = make_retriever(self.index, self.similarity_top_k, filters=self.make_filters(values))
+        return retriever.retrieve(query)
+
+    def query(self, query: str, values: Sequence[str]):
+        nodes = self.retrieve(query, values)
+        return self.synthesizer.synthesize(QueryBundle(query), nodes)
+
+
+def get_filtered_query_engine(index, filter_key: str, operator: str = "contains", condition: str = "and",
+                              similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+                              response_mode: str = "compact", candidate_index=None,
+                              retrieval: str = "vector") -> FilteredQueryEngine:
+    return _cached(
+        index, ("filtered", filter_key, operator, condition, similarity_top_k, response_mode, id(Settings.llm),
+                id(candidate_index), retrieval),
+        lambda: FilteredQueryEngine(index, filter_key, operator, condition, similarity_top_k, response_mode,
+                                    candidate_index, retrieval),
+    )
@@ -0,0 +1,136 @@
+# core/extractors.py
+import re
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.extractors import BaseExtractor
+from llama_index.core.schema import BaseNode
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z'-]+")
+
+# 英文停用词 + 菜谱文本里到处出现的模板词/计量单位，这些词不适合作为关键词
+STOP_WORDS = frozenset("""
+a about after again all also an and any are as at be been before but by can cook cooking cup cups
+deselect do each for from further get have heat hr hrs if in into is it its large level medium min
+minutes more no not of off on or other ounce ounces out over per pound pounds prep prepare recipe
+remove serve servings small so some step steps tablespoon tablespoons teaspoon teaspoons than that
+the then there these this through time to total until up use very when while with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def count_matrix(texts: Sequence[str], vocab: Dict[str, int], grow: bool) -> sparse.csr_matrix:
+    """(文本数, 词表大小) 的词频矩阵；grow=True 时把新词追加进 vocab，否则忽略词表外的词"""
+    rows, cols = [], []
+    for i, text in enumerate(texts):
+        for token in tokenize(text):
+            col = vocab.get(token)
+            if col is None:
+                if not grow:
+                    continue
+                col = vocab[token] = len(vocab)
+            rows.append(i)
+            cols.append(col)
+    data = np.ones(len(rows), dtype=np.float32)
+    # 重复的 (行, 列) 在转换为 CSR 时自动累加成词频
+    return sparse.coo_matrix((data, (rows, cols)), shape=(len(texts), len(vocab))).tocsr()
+
+
+class TfidfMetadataExtractor(BaseExtractor):
+    """不调用 LLM 的元数据抽取：标题直接取菜谱名，关键词取语料级 TF-IDF 得分最高的词。
+
+    写入与 TitleExtractor / KeywordExtractor 相同的 document_title 和 excerpt_keywords 字段。
+    """
+
+    keywords: int = Field(default=5, description="每个节点保留的关键词数")
+    max_df_ratio: float = Field(default=0.5, description="文档频率超过该比例的词视为通用词忽略")
+
+    _vocab: Optional[Dict[str, int]] = PrivateAttr(default=None)
+    _idf: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, corpus: Optional[Iterable[str]] = None, **kwargs):
+        super().__init__(**kwargs)
+        if corpus is not None:
+            self.fit(corpus)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TfidfMetadataExtractor"
+
+    @property
+    def fitted_state(self) -> Optional[Tuple[Dict[str, int], np.ndarray]]:
+        """(词表, idf)；用于把拟合结果传给其他进程（pydantic 序列化会丢弃私有属性）"""
+        if self._vocab is None:
+            return None
+        return self._vocab, self._idf
+
+    @classmethod
+    def from_fitted_state(cls, state: Tuple[Dict[str, int], np.ndarray], **kwargs) -> "TfidfMetadataExtractor":
+        extractor = cls(**kwargs)
+        extractor._vocab, extractor._idf = state
+        return extractor
+
+    def _count_matrix(self, texts: Sequence[str], vocab: Dict[str, int], grow: bool) -> sparse.csr_matrix:
+        return count_matrix(texts, vocab, grow)
+
+    def fit(self, texts: Iterable[str], chunk_size: int = 1000) -> "TfidfMetadataExtractor":
+        # 分块累加文档频率，texts 可以是流式生成器，内存只与词表大小相关
+        vocab: Dict[str, int] = {}
+        df = np.zeros(0, dtype=np.float32)
+        n_docs = 0
+        texts = iter(texts)
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                break
+            counts = self._count_matrix(chunk, vocab, grow=True)
+            chunk_df = np.bincount(counts.indices, minlength=len(vocab)).astype(np.float32)
+            chunk_df[:len(df)] += df
+            df = chunk_df
+            n_docs += len(chunk)
+        idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+        if n_docs > 1:
+            idf[df > self.max_df_ratio * n_docs] = 0.0
+        self._vocab, self._idf = vocab, idf
+        return self
+
+    def top_keywords(self, texts: Sequence[str]) -> List[List[str]]:
+        if self._vocab is None:
+            self.fit(texts)
+        counts = self._count_matrix(texts, self._vocab, grow=False)
+        # 次线性词频 + IDF，再按行做 L2 归一化
+        counts.data = 1.0 + np.log(counts.data)
+        tfidf = counts.multiply(self._idf).tocsr()
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+        tfidf = sparse.diags(1.0 / np.maximum(norms, 1e-12)) @ tfidf
+
+        id_to_term = np.empty(len(self._vocab), dtype=object)
+        id_to_term[list(self._vocab.values())] = list(self._vocab.keys())
+
+        results = []
+        for i in range(tfidf.shape[0]):
+            start, end = tfidf.indptr[i], tfidf.indptr[i + 1]
+            scores, cols = tfidf.data[start:end], tfidf.indices[start:end]
+            keep = scores > 0
+            scores, cols = scores[keep], cols[keep]
+            if len(scores) > self.keywords:
+                top = np.argpartition(-scores, self.keywords)[:self.keywords]
+                scores, cols = scores[top], cols[top]
+            results.append(list(id_to_term[cols[np.argsort(-scores)]]))
+        return results
+
+    async def aextract(self, nodes: Sequence[BaseNode]) -> List[Dict]:
+        keyword_lists = self.top_keywords([node.get_content() for node in nodes])
+        return [
+            {
+                "document_title": node.metadata.get("recipe_name", ""),
+                "excerpt_keywords": ", ".join(keywords),
+            }
+            for node, keywords in zip(nodes, keyword_lists)
+        ]
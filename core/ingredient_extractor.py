@@ -0,0 +1,221 @@
+# core/ingredient_extractor.py
+import ast
+import os
+import re
+import threading
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.loader import iter_recipes
+from core.prepare import parse_recipe_record
+
+DEFAULT_SCRAPE_PATH = "data/scrape.py"
+DEFAULT_RECIPE_PATHS = ("data/recipe.json", "sample.json")
+TARGET_LISTS = ("proteins", "vegetables_and_fruits", "staple_foods")
+
+# 配料行里的计量单位和修饰词，抽取语料词表时去掉
+UNITS = frozenset("""
+cup cups tablespoon tablespoons tbsp teaspoon teaspoons tsp pound pounds lb lbs ounce ounces oz gram grams g kg
+ml liter liters quart quarts pint pints can cans package packages bunch bunches clove cloves slice slices stick
+sticks sprig sprigs pinch dash dashes head heads piece pieces jar jars bottle bottles box boxes bag bags
+""".split())
+DESCRIPTORS = frozenset("""
+a an and of the good fresh freshly ground chopped minced diced sliced grated shredded crushed dried whole large
+small medium extra virgin finely coarsely thinly thickly cut peeled seeded trimmed softened melted room temperature
+unsalted salted kosher to taste plus more about optional boneless skinless halved quartered packed firmly lightly
+deselect all
+hot cold warm chilled boiling iced half less very roughly big little few several some each one two three four five
+six inch inches handful bundle serving servings cover separated beaten whisked suggested together full s
+""".split())
+# 介词：短语开头的介词去掉，短语中间的介词处截断（"tuna in oil" 取 "tuna"，"with water" 取 "water"）
+PREPOSITIONS = frozenset("with in on into from".split())
+# 只能修饰食材、不能单独作为食材的词：颜色、质地、形状以及 meal / mix 之类的泛称
+MODIFIERS = frozenset("""
+red white green black yellow brown golden purple
+thin thick firm soft hard crisp crusty fine coarse dry heavy light dark lean low plain raw ripe toasted smoked
+roasted cooked frozen mixed seasoned english top base mix blend meal sea seasoning chunk cube strip
+""".split())
+PHRASE_STOP = re.compile(r",|\(|\bsuch as\b|\bcut into\b|\bfor\b|\bor\b|\bat room\b|\bto taste\b")
+IRREGULAR_SINGULARS = {"leaves": "leaf", "halves": "half", "loaves": "loaf"}
+IRREGULAR_PLURALS = {singular: plural for plural, singular in IRREGULAR_SINGULARS.items()}
+
+
+def pluralize(word: str) -> List[str]:
+    if word in IRREGULAR_PLURALS:
+        return [IRREGULAR_PLURALS[word]]
+    if word.endswith("y") and len(word) > 2 and word[-2] not in "aeiou":
+        return [word[:-1] + "ies"]
+    if word.endswith(("s", "x", "ch", "sh", "o")):
+        return [word + "es", word + "s"]
+    return [word + "s"]
+
+
+def singularize(word: str) -> str:
+    if word in IRREGULAR_SINGULARS:
+        return IRREGULAR_SINGULARS[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def surface_forms(term: str) -> List[str]:
+    """一个词条的所有表面形式：原形、单数、复数（多词词条只变最后一个词）"""
+    words = term.split()
+    head, last = words[:-1], words[-1]
+    lasts = {last, singularize(last), *pluralize(last), *pluralize(singularize(last))}
+    return sorted({" ".join(head + [w]) for w in lasts})
+
+
+def load_target_vocabulary(path: str = DEFAULT_SCRAPE_PATH) -> List[str]:
+    """静态读取 data/scrape.py 中的目标食材列表（该脚本导入时会直接开始爬取，不能 import）"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    terms = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) in TARGET_LISTS for t in node.targets):
+            terms.extend(ast.literal_eval(node.value))
+    return terms
+
+
+def is_ingredient_term(term: str) -> bool:
+    """至少含一个不是修饰词的名词（"red" "meal" 不算食材，"red onion" "cracker meal" 算）"""
+    return len(term) > 2 and any(
+        w not in MODIFIERS and w not in DESCRIPTORS and w not in PREPOSITIONS and w not in UNITS
+        for w in term.split()
+    )
+
+
+def ingredient_phrases(line: str) -> List[str]:
+    """从一行配料（如 "1 pound carrots, sliced"）中取出食材名的末尾一到两个词"""
+    line = PHRASE_STOP.split(line.lower(), 1)[0]
+    words = [w for w in re.findall(r"[a-z]+(?:-[a-z]+)?", line) if w not in UNITS and w not in DESCRIPTORS]
+    while words and words[0] in PREPOSITIONS:
+        words.pop(0)
+    for i, word in enumerate(words):
+        if word in PREPOSITIONS:
+            words = words[:i]
+            break
+    if not words:
+        return []
+    phrases = [singularize(words[-1])]
+    if len(words) >= 2:
+        phrases.append(f"{words[-2]} {singularize(words[-1])}")
+    return [phrase for phrase in phrases if is_ingredient_term(phrase)]
+
+
+def load_corpus_vocabulary(paths: Iterable[str] = DEFAULT_RECIPE_PATHS, min_df: int = 2) -> List[str]:
+    """语料词表：在至少 min_df 道菜谱的配料中出现过的食材名"""
+    df: Counter = Counter()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for name, details in iter_recipes(path):
+            record = parse_recipe_record(name, details)
+            df.update({p for line in record["ingredients"] for p in ingredient_phrases(line)})
+    return [term for term, count in df.items() if count >= min_df]
+
+
+class IngredientExtractor:
+    """Aho-Corasick 自动机：一次扫描查询文本找出所有词表中的食材，耗时与查询长度成线性关系。
+
+    词表中的每个词条连同单复数形式一起编译进自动机，匹配结果映射回词条原形；
+    重叠的匹配取最左最长（"sweet potatoes" 只返回 "sweet potato"，不再单独返回 "potato"）。
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        self.size = 0
+        for term in terms:
+            term = " ".join(term.lower().split())
+            if not term:
+                continue
+            self.size += 1
+            for form in surface_forms(term):
+                self._add(form, term)
+        self._build_fail_links()
+
+    def _add(self, form: str, term: str) -> None:
+        state = 0
+        for char in form:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if all(t != term for _, t in self._out[state]):
+            self._out[state].append((len(form), term))
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """所有在单词边界上的匹配 (起点, 终点, 词条)"""
+        text = text.lower()
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, term in self._out[state]:
+                start, end = i + 1 - length, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    matches.append((start, end, term))
+        return matches
+
+    def extract(self, text: str) -> List[str]:
+        """按出现顺序返回去重后的食材词条"""
+        chosen, last_end = [], -1
+        for start, end, term in sorted(self.find_all(text), key=lambda m: (m[0], m[0] - m[1])):
+            if start >= last_end:
+                chosen.append(term)
+                last_end = end
+        return list(dict.fromkeys(chosen))
+
+
+_extractor: Optional[IngredientExtractor] = None
+_lock = threading.Lock()
+
+
+def build_ingredient_extractor(scrape_path: str = DEFAULT_SCRAPE_PATH,
+                               recipe_paths: Iterable[str] = DEFAULT_RECIPE_PATHS,
+                               min_df: int = 2) -> IngredientExtractor:
+    targets = {term for term in load_target_vocabulary(scrape_path) if is_ingredient_term(term.lower())}
+    terms = targets | set(load_corpus_vocabulary(recipe_paths, min_df))
+    extractor = IngredientExtractor(sorted(terms))
+    print(f"[INFO] 食材词表自动机构建完成：{extractor.size} 个词条")
+    return extractor
+
+
+def get_ingredient_extractor() -> IngredientExtractor:
+    global _extractor
+    with _lock:
+        if _extractor is None:
+            _extractor = build_ingredient_extractor()
+        return _extractor
+
+
+def set_ingredient_extractor(extractor: IngredientExtractor) -> None:
+    global _extractor
+    with _lock:
+        _extractor = extractor
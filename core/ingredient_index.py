@@ -0,0 +1,145 @@
+# core/ingredient_index.py
+import json
+import os
+import re
+from collections import defaultdict
+from heapq import nsmallest
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.docstore import iter_docstore_nodes
+from core.registry import attach, attached
+
+INGREDIENT_INDEX_FILE = "ingredient_index.json"
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def _normalize_word(word: str) -> str:
+    # 简单的复数归一：eggs -> egg, tomatoes -> tomato, berries -> berry
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def ingredient_words(text: str) -> List[str]:
+    return [_normalize_word(w) for w in WORD_PATTERN.findall(text.lower())]
+
+
+def ingredients_section(text: str) -> str:
+    """取节点文本中 Ingredients: 与 Steps: 之间的部分；没有 Ingredients: 时返回空串"""
+    if "Ingredients:" not in text:
+        return ""
+    return text.split("Ingredients:", 1)[1].split("Steps:", 1)[0]
+
+
+def ingredient_terms(section: str) -> Set[str]:
+    # 按行内相邻词生成单词项和双词项，双词项用于 "olive oil" 这类多词食材的短语匹配
+    terms = set()
+    for line in section.split(","):
+        words = ingredient_words(line)
+        terms.update(words)
+        terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+class IngredientIndex:
+    """食材词 -> 菜谱名 的倒排索引。
+
+    按完整词匹配（"egg" 不会命中 "eggplant"），查询只访问查询词对应的倒排表，耗时与语料规模无关。
+    持久化时只保存 菜谱名 -> 词项 的正排表，加载时重建倒排表；正排表也用于增量更新时删除旧词项。
+    """
+
+    def __init__(self, recipe_terms: Optional[Dict[str, Iterable[str]]] = None):
+        self._recipe_terms: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        for name, terms in (recipe_terms or {}).items():
+            self._add_terms(name, set(terms))
+
+    def __len__(self) -> int:
+        return len(self._recipe_terms)
+
+    def __contains__(self, recipe_name: str) -> bool:
+        return recipe_name in self._recipe_terms
+
+    def _add_terms(self, recipe_name: str, terms: Set[str]) -> None:
+        self._recipe_terms.setdefault(recipe_name, set()).update(terms)
+        for term in terms:
+            self._postings[term].add(recipe_name)
+
+    def add(self, recipe_name: str, text: str) -> None:
+        """加入一段菜谱文本；同一菜谱被切成多个节点时可以多次调用，词项合并"""
+        section = ingredients_section(text)
+        if section:
+            self._add_terms(recipe_name, ingredient_terms(section))
+
+    def remove(self, recipe_name: str) -> None:
+        for term in self._recipe_terms.pop(recipe_name, ()):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.discard(recipe_name)
+                if not posting:
+                    del self._postings[term]
+
+    def recipes_with(self, ingredient: str) -> Set[str]:
+        words = ingredient_words(ingredient)
+        if not words:
+            return set()
+        if len(words) == 1:
+            return self._postings.get(words[0], set())
+        # 多词食材：所有相邻双词项都出现才算命中
+        bigrams = [f"{a} {b}" for a, b in zip(words, words[1:])]
+        postings = sorted((self._postings.get(b, set()) for b in bigrams), key=len)
+        return set.intersection(*postings)
+
+    def match(self, ingredients: Iterable[str], top_k: int = 3) -> List[Tuple[str, int]]:
+        """返回命中食材数最多的 top_k 个 (菜谱名, 命中数)，同分按菜谱名排序"""
+        return self.match_many([ingredients], top_k)[0]
+
+    def match_many(self, ingredient_sets: Iterable[Iterable[str]], top_k: int = 3) -> List[List[Tuple[str, int]]]:
+        """批量版 match：所有食材组合中出现的每种食材只查一次倒排表，结果与输入顺序一致"""
+        sets = [set(i.strip().lower() for i in ingredients if i and i.strip()) for ingredients in ingredient_sets]
+        postings = {ingredient: self.recipes_with(ingredient) for ingredient in set().union(*sets)}
+        results = []
+        for ingredients in sets:
+            scores: Dict[str, int] = defaultdict(int)
+            for ingredient in ingredients:
+                for name in postings[ingredient]:
+                    scores[name] += 1
+            results.append(nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0])))
+        return results
+
+    @classmethod
+    def from_docstore(cls, docstore) -> "IngredientIndex":
+        index = cls()
+        for node in iter_docstore_nodes(docstore):
+            name = node.metadata.get("recipe_name")
+            if name is not None:
+                index.add(name, node.get_content())
+        return index
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({name: sorted(terms) for name, terms in self._recipe_terms.items()}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "IngredientIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> Optional["IngredientIndex"]:
+        path = os.path.join(persist_dir, INGREDIENT_INDEX_FILE)
+        return cls.load(path) if os.path.exists(path) else None
+
+
+def attach_ingredient_index(index, ingredient_index: IngredientIndex) -> None:
+    attach(index, "ingredient_index", ingredient_index)
+
+
+def get_ingredient_index(index) -> IngredientIndex:
+    """取索引对应的食材倒排索引；未随索引加载时从 docstore 构建一次并缓存"""
+    return attached(index, "ingredient_index",
+                    lambda: IngredientIndex.from_docstore(index.storage_context.docstore))
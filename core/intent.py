@@ -0,0 +1,108 @@
+# core/intent.py
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core import Settings
+
+# 明显的意图提示：命中即直接给出标签，不需要计算嵌入。
+# 只收录带目标的短语（"recipes similar to <菜名>"、"scale to 6"、"for 4 people"），
+# 单独的 "similar" "servings" "scale" 在别的问题里也很常见（"how many servings does lasagna make?"），交给嵌入分类判断
+# 相似意图的提示用 target 分组标出目标菜名，分支处理时用同一个正则取出菜名（见 cue_target）
+SIMILAR_CUES = [
+    r"\b(?:recipes?|dish(?:es)?|meals?|something|anything)\s+(?:similar to|like)\s+(?P<target>[^?.!,，。？！]+)",
+    r"\bsimilar\s+(?:recipes?|dish(?:es)?|meals?)\s+(?:to|as)\s+(?P<target>[^?.!,，。？！]+)",
+    r"(?:和|跟|与)(?P<target>.+?)(?:相似|类似|差不多)的(?:菜|菜谱|食谱|做法)",
+    r"类似(?P<target>.+?)的(?:菜|菜谱|食谱|做法)",
+]
+SCALE_CUES = [
+    r"\bscale\b.*?\b(?:to|for|by|up to|down to)\s+\d+",
+    r"\b(?:for|to|serves?|feed)\s+\d+\s+(?:people|persons|guests|servings|portions)\b",
+    r"\b(?:double|triple|halve)\s+(?:the|this|that|it|my)\b",
+    r"减半", r"加倍", r"\d+\s*人份",
+]
+# 表示倍数的词，先于数字判断（"减半" "double the recipe" 里没有数字）
+SCALE_WORDS = {"减半": 0.5, "一半": 0.5, "加倍": 2.0, "两倍": 2.0, "double": 2.0, "triple": 3.0, "halve": 0.5}
+
+
+def cue_target(query: str, patterns: Sequence[str] = SIMILAR_CUES) -> Optional[str]:
+    """命中的提示短语里 target 分组的内容（"show me dishes like beef stroganoff" 取 "beef stroganoff"）"""
+    for pattern in patterns:
+        match = re.search(pattern, query, re.IGNORECASE)
+        if match and match.groupdict().get("target"):
+            target = match.group("target").strip()
+            if target:
+                return target
+    return None
+
+
+def scale_factor(text: str) -> Optional[float]:
+    """调整份量的倍数：先查 SCALE_WORDS，再取第一个数字；都没有时返回 None"""
+    lowered = text.lower()
+    for word, factor in SCALE_WORDS.items():
+        if re.search(rf"\b{word}\b", lowered) if word.isascii() else word in lowered:
+            return factor
+    numbers = re.findall(r"\d+(?:\.\d+)?", text)
+    return float(numbers[0]) if numbers else None
+
+
+class IntentClassifier:
+    """基于嵌入原型的意图分类：查询向量与每个标签的示例句向量做余弦相似度，取各标签的最高分。
+
+    示例句只在第一次分类时（或嵌入模型更换后）批量嵌入一次，之后每次分类只需嵌入查询本身，
+    再做一次矩阵-向量乘法。置信度是各标签得分按 temperature 做 softmax 后最高标签的概率。
+    """
+
+    def __init__(self, examples: Dict[str, Sequence[str]], cues: Optional[Dict[str, Sequence[str]]] = None,
+                 temperature: float = 0.05, embed_model=None):
+        self.labels: List[str] = list(examples)
+        self.examples = [(label, text) for label in self.labels for text in examples[label]]
+        self.cues = [(label, re.compile(pattern, re.IGNORECASE))
+                     for label, patterns in (cues or {}).items() for pattern in patterns]
+        self.temperature = temperature
+        self.embed_model = embed_model
+        self._label_ids = np.array([self.labels.index(label) for label, _ in self.examples])
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._model_id: Optional[int] = None
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+    def _prototypes(self, embed_model) -> np.ndarray:
+        with self._lock:
+            if self._matrix is None or self._model_id != id(embed_model):
+                vectors = embed_model.get_text_embedding_batch([text for _, text in self.examples])
+                self._matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+                self._model_id = id(embed_model)
+            return self._matrix
+
+    def match_cue(self, query: str) -> Optional[str]:
+        for label, pattern in self.cues:
+            if pattern.search(query):
+                return label
+        return None
+
+    def scores(self, query_embedding, embed_model=None) -> np.ndarray:
+        """每个标签的得分（该标签所有示例句与查询的最高余弦相似度），顺序同 self.labels"""
+        matrix = self._prototypes(embed_model or self.embed_model or Settings.embed_model)
+        sims = matrix @ self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        label_scores = np.full(len(self.labels), -1.0, dtype=np.float32)
+        np.maximum.at(label_scores, self._label_ids, sims)
+        return label_scores
+
+    def classify(self, query: str, query_embedding=None) -> Tuple[str, float]:
+        """返回 (标签, 置信度)；关键词提示命中时置信度为 1.0"""
+        label = self.match_cue(query)
+        if label is not None:
+            return label, 1.0
+        embed_model = self.embed_model or Settings.embed_model
+        if query_embedding is None:
+            query_embedding = embed_model.get_query_embedding(query)
+        label_scores = self.scores(query_embedding, embed_model)
+        logits = (label_scores - label_scores.max()) / self.temperature
+        probs = np.exp(logits) / np.exp(logits).sum()
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
@@ -0,0 +1,116 @@
+# core/keyword_index.py
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from core.docstore import iter_docstore_nodes
+from core.registry import attach, attached
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+KEYWORD_FIELD = "excerpt_keywords"
+
+
+def keyword_terms(value: str) -> Set[str]:
+    """excerpt_keywords（逗号分隔）中的关键词短语，以及多词短语中的每个单词"""
+    terms = set()
+    for phrase in value.lower().split(","):
+        phrase = " ".join(phrase.split())
+        if phrase:
+            terms.add(phrase)
+            terms.update(re.findall(r"\w+", phrase))
+    return terms
+
+
+class KeywordIndex:
+    """关键词 -> 节点 id 的倒排索引，把关键词过滤条件在向量检索之前解析成候选节点列表。
+
+    按完整短语或完整单词匹配："chicken" 命中 "chicken breast"，但 "egg" 不会命中 "eggplant"。
+    持久化时只保存 节点 id -> 词项 的正排表，加载时重建倒排表。
+    """
+
+    def __init__(self, node_terms: Optional[Dict[str, Iterable[str]]] = None, field: str = KEYWORD_FIELD):
+        self.field = field
+        self._node_terms: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        for node_id, terms in (node_terms or {}).items():
+            self._add_terms(node_id, set(terms))
+
+    def __len__(self) -> int:
+        return len(self._node_terms)
+
+    def _add_terms(self, node_id: str, terms: Set[str]) -> None:
+        self._node_terms[node_id] = terms
+        for term in terms:
+            self._postings[term].add(node_id)
+
+    def add(self, node_id: str, keywords: str) -> None:
+        self.remove(node_id)
+        terms = keyword_terms(keywords)
+        if terms:
+            self._add_terms(node_id, terms)
+
+    def add_nodes(self, nodes: Iterable) -> None:
+        for node in nodes:
+            keywords = node.metadata.get(self.field)
+            if keywords:
+                self.add(node.node_id, keywords)
+
+    def remove(self, node_id: str) -> None:
+        for term in self._node_terms.pop(node_id, ()):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.discard(node_id)
+                if not posting:
+                    del self._postings[term]
+
+    def remove_many(self, node_ids: Iterable[str]) -> None:
+        for node_id in node_ids:
+            self.remove(node_id)
+
+    def nodes_with(self, keyword: str) -> Set[str]:
+        return self._postings.get(" ".join(keyword.lower().split()), set())
+
+    def candidates(self, keywords: Sequence[str], condition: str = "and") -> List[str]:
+        """condition="and" 时返回包含全部关键词的节点，"or" 时返回包含任一关键词的节点"""
+        postings = [self.nodes_with(k) for k in keywords if k and k.strip()]
+        if not postings:
+            return []
+        if condition == "and":
+            postings.sort(key=len)
+            result = set(postings[0]).intersection(*postings[1:])
+        elif condition == "or":
+            result = set().union(*postings)
+        else:
+            raise ValueError(f"Unknown condition: {condition}")
+        return sorted(result)
+
+    @classmethod
+    def from_docstore(cls, docstore, field: str = KEYWORD_FIELD) -> "KeywordIndex":
+        index = cls(field=field)
+        index.add_nodes(iter_docstore_nodes(docstore))
+        return index
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({node_id: sorted(terms) for node_id, terms in self._node_terms.items()}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> Optional["KeywordIndex"]:
+        path = os.path.join(persist_dir, KEYWORD_INDEX_FILE)
+        return cls.load(path) if os.path.exists(path) else None
+
+
+def attach_keyword_index(index, keyword_index: KeywordIndex) -> None:
+    attach(index, "keyword_index", keyword_index)
+
+
+def get_keyword_index(index) -> KeywordIndex:
+    """取索引对应的关键词倒排索引；未随索引加载时从 docstore 构建一次并缓存"""
+    return attached(index, "keyword_index", lambda: KeywordIndex.from_docstore(index.storage_context.docstore))
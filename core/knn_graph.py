@@ -0,0 +1,113 @@
+# core/knn_graph.py
+import os
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.registry import attach, attached
+from core.similarity import RecipeVectors, get_recipe_vectors, topk_rows
+
+KNN_GRAPH_FILE = "knn_graph.npz"
+DEFAULT_KNN_K = 10
+
+
+class KnnGraph:
+    """预先计算的菜谱 k 近邻表：neighbors 为 int32 (N, k) 行号，scores 为 float16 (N, k) 余弦相似度。
+
+    查询某道菜的相似菜谱只是一次字典查找加一行切片；不足 k 个邻居的位置填 -1。
+    """
+
+    def __init__(self, names: List[str], neighbors: np.ndarray, scores: np.ndarray):
+        self.names = list(names)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float16)
+        self.name_to_row = {name: i for i, name in enumerate(self.names)}
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def build(cls, vectors: RecipeVectors, k: int = DEFAULT_KNN_K, block_size: int = 1024) -> "KnnGraph":
+        start = time.perf_counter()
+        neighbors, scores = topk_rows(vectors.matrix, np.arange(len(vectors)), k, block_size)
+        print(f"[INFO] 相似菜谱图构建完成：{len(vectors)} 个菜谱，k={k}，用时 {time.perf_counter() - start:.2f}s")
+        return cls(vectors.names, neighbors, scores)
+
+    def similar_to(self, name: str, k: int = 3) -> Optional[List[Tuple[str, float]]]:
+        """返回 name 的前 k 个相似菜谱；菜谱不在图中或 k 超过图的 k 时返回 None，由调用方退回到实时计算"""
+        row = self.name_to_row.get(name)
+        if row is None or k > self.k:
+            return None
+        return [(self.names[j], float(s)) for j, s in zip(self.neighbors[row, :k], self.scores[row, :k]) if j >= 0]
+
+    def update(self, vectors: RecipeVectors, changed: Iterable[str], block_size: int = 1024) -> "KnnGraph":
+        """菜谱增删改后增量更新：vectors 为更新后的菜谱向量，changed 为新增或修改的菜谱名。
+
+        自身变化、或邻居被删除/修改的行整行重算；其余行只和变化的菜谱比较并合并进原有的 top-k。
+        """
+        k, n = self.k, len(vectors)
+        old_to_new = np.array([vectors.name_to_row.get(name, -1) for name in self.names] + [-1], dtype=np.int64)
+        changed_mask = np.zeros(n + 1, dtype=bool)
+        changed_mask[[vectors.name_to_row[name] for name in changed if name in vectors.name_to_row]] = True
+
+        # 旧邻居行号映射到新行号，-1（填充或已删除）统一映射到哨兵位置 n
+        mapped = old_to_new[np.where(self.neighbors >= 0, self.neighbors, len(self.names))]
+        mapped[mapped < 0] = n
+        lost = (mapped == n) & (self.neighbors >= 0)
+        stale = lost.any(axis=1) | changed_mask[mapped].any(axis=1)
+
+        neighbors = np.full((n, k), -1, dtype=np.int32)
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        recompute = np.ones(n, dtype=bool)
+        kept_old = np.flatnonzero((old_to_new[:-1] >= 0) & ~stale & ~changed_mask[old_to_new[:-1]])
+        kept_new = old_to_new[kept_old]
+        neighbors[kept_new] = np.where(mapped[kept_old] == n, -1, mapped[kept_old])
+        scores[kept_new] = self.scores[kept_old].astype(np.float32)
+        recompute[kept_new] = False
+
+        changed_rows = np.flatnonzero(changed_mask[:n])
+        if len(changed_rows) and len(kept_new):
+            # 未重算的行：与变化的菜谱比较，合并进原有邻居后重新取 top-k
+            for start in range(0, len(kept_new), block_size):
+                rows = kept_new[start:start + block_size]
+                sims = vectors.matrix[rows] @ vectors.matrix[changed_rows].T
+                cand = np.concatenate([neighbors[rows], np.broadcast_to(changed_rows, sims.shape)], axis=1)
+                cand_scores = np.concatenate([np.where(neighbors[rows] >= 0, scores[rows], -np.inf), sims], axis=1)
+                order = np.argsort(-cand_scores, axis=1)[:, :k]
+                neighbors[rows] = np.take_along_axis(cand, order, axis=1)
+                scores[rows] = np.take_along_axis(cand_scores, order, axis=1)
+
+        redo = np.flatnonzero(recompute)
+        if len(redo):
+            neighbors[redo], scores[redo] = topk_rows(vectors.matrix, redo, k, block_size)
+        neighbors[np.isneginf(scores)] = -1
+        print(f"[INFO] 相似菜谱图增量更新：重算 {len(redo)} 行，合并 {len(kept_new)} 行")
+        self.__init__(vectors.names, neighbors, scores)
+        return self
+
+    def save(self, path: str) -> None:
+        np.savez(path, names=np.array(self.names, dtype=str), neighbors=self.neighbors, scores=self.scores)
+
+    @classmethod
+    def load(cls, path: str) -> "KnnGraph":
+        with np.load(path) as data:
+            return cls(data["names"].tolist(), data["neighbors"], data["scores"])
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> Optional["KnnGraph"]:
+        path = os.path.join(persist_dir, KNN_GRAPH_FILE)
+        return cls.load(path) if os.path.exists(path) else None
+
+
+def attach_knn_graph(index, graph: KnnGraph) -> None:
+    attach(index, "knn_graph", graph)
+
+
+def get_knn_graph(index, build: bool = True) -> Optional[KnnGraph]:
+    """取索引对应的相似菜谱图；未随索引加载时从菜谱向量构建一次并缓存，build=False 时直接返回 None"""
+    return attached(index, "knn_graph", (lambda: KnnGraph.build(get_recipe_vectors(index))) if build else None)
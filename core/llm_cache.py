@@ -0,0 +1,171 @@
+# core/llm_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from llama_index.llms.ollama import Ollama
+
+DEFAULT_LLM_CACHE_PATH = "./data/llm_cache.sqlite"
+
+
+def normalize_prompt(prompt: str) -> str:
+    # 空白和大小写不同的相同问题视为同一个提示
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+class CompletionCache:
+    """LLM 补全缓存：内存 LRU 在前，SQLite 持久化在后，按 (模型名, 归一化提示) 的哈希为键。
+
+    超过 ttl 秒的条目视为过期；持久化层超出 max_entries 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_LLM_CACHE_PATH, max_entries: int = 50_000,
+                 memory_entries: int = 1024, ttl: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._conn = None
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key BLOB PRIMARY KEY, model TEXT NOT NULL, text TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions(last_used)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> bytes:
+        return hashlib.sha256(f"{model_name}\0{normalize_prompt(prompt)}".encode("utf-8")).digest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: bytes, text: str, created: float) -> None:
+        self._memory[key] = (text, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        key = self.make_key(model_name, prompt)
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and not self._expired(cached[1], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return cached[0]
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                row = self._conn.execute("SELECT text, created FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, model_name: str, prompt: str, text: str) -> None:
+        key = self.make_key(model_name, prompt)
+        now = time.time()
+        with self._lock:
+            self._remember(key, text, now)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, text, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, model_name, text, now, now),
+                )
+                self._evict(now)
+                self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)", (overflow,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        size = len(self._memory)
+        if self._conn is not None:
+            with self._lock:
+                size = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+
+_cache: Optional[CompletionCache] = None
+_clients: Dict[Tuple[str, str, float], Ollama] = {}
+_module_lock = threading.Lock()
+
+
+def configure_completion_cache(path: Optional[str] = DEFAULT_LLM_CACHE_PATH, max_entries: int = 50_000,
+                               memory_entries: int = 1024, ttl: Optional[float] = 7 * 24 * 3600) -> CompletionCache:
+    """替换所有 LLM 辅助函数共享的补全缓存；path=None 时只用内存层"""
+    global _cache
+    with _module_lock:
+        _cache = CompletionCache(path, max_entries=max_entries, memory_entries=memory_entries, ttl=ttl)
+        return _cache
+
+
+def get_completion_cache() -> CompletionCache:
+    global _cache
+    with _module_lock:
+        if _cache is None:
+            _cache = CompletionCache()
+        return _cache
+
+
+def get_llm(model: str = "tinyllama:1.1b", request_timeout: float = 600.0,
+            base_url: str = "http://localhost:11434") -> Ollama:
+    """复用同一模型的 Ollama 客户端（以及其中的 HTTP 连接），不在每次调用时重新创建"""
+    key = (model, base_url, request_timeout)
+    with _module_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            llm = _clients[key] = Ollama(model=model, base_url=base_url, request_timeout=request_timeout)
+        return llm
+
+
+def cached_complete(prompt: str, llm=None, model: str = "tinyllama:1.1b", use_cache: bool = True) -> str:
+    """带缓存的 LLM 补全，返回去掉首尾空白的文本；llm 为空时使用 get_llm(model)"""
+    llm = llm or get_llm(model)
+    model_name = getattr(llm, "model", None) or type(llm).__name__
+    cache = get_completion_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(model_name, prompt)
+        if cached is not None:
+            return cached
+    text = llm.complete(prompt).text.strip()
+    if cache is not None:
+        cache.put(model_name, prompt, text)
+    return text
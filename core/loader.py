@@ -0,0 +1,105 @@
+# core/loader.py
+import json
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core import Document
+
+from core.prepare import iter_documents
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def _iter_json_object_items(f, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Dict]]:
+    """逐个解析顶层 JSON 对象的键值对，内存占用只取决于单个菜谱的大小"""
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+                # 数值等标量可能恰好在缓冲区末尾被截断，需要读到后续字符再确认
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    def expect(char: str) -> None:
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != char:
+            raise ValueError(f"Malformed recipe JSON: expected '{char}'")
+        pos += 1
+
+    expect("{")
+    skip_ws()
+    if pos < len(buf) and buf[pos] == "}":
+        return
+    while True:
+        skip_ws()
+        key = decode()
+        expect(":")
+        skip_ws()
+        yield key, decode()
+        skip_ws()
+        if pos < len(buf) and buf[pos] == ",":
+            pos += 1
+            continue
+        expect("}")
+        return
+
+
+def _iter_jsonl_items(f) -> Iterator[Tuple[str, Dict]]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        # 支持两种行格式：{"name": ..., ...字段} 或 {菜谱名: {...字段}}
+        if "name" in record and isinstance(record["name"], str):
+            name = record.pop("name")
+            yield name, record
+        else:
+            yield from record.items()
+
+
+# 流式读取菜谱文件（.json 顶层对象或 .jsonl），按 (菜谱名, 详情) 逐条产出
+def iter_recipes(path: str) -> Iterator[Tuple[str, Dict]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            yield from _iter_jsonl_items(f)
+        else:
+            yield from _iter_json_object_items(f)
+
+
+def iter_document_batches(path: str, batch_size: int = 256,
+                          on_record: Optional[Callable[[Dict], None]] = None) -> Iterator[List[Document]]:
+    documents = iter_documents(iter_recipes(path), on_record)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,113 @@
+# core/name_index.py
+import re
+from collections import Counter, defaultdict
+from heapq import nlargest
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.recipes import get_recipe_store
+from core.registry import attached, detach
+
+
+def normalize_name(name: str) -> str:
+    # 大小写折叠，标点视为空白，合并连续空白
+    return " ".join(re.sub(r"[^\w\s]", " ", name.casefold()).split())
+
+
+def char_ngrams(text: str, n: int = 3) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))]
+
+
+def edit_distance(a: str, b: str, bound: int, substring: bool = False) -> int:
+    """a 与 b 的编辑距离，超过 bound 时提前返回 bound + 1；
+    substring=True 时计算 a 与 b 中最接近的子串之间的距离（b 首尾多出的字符不计代价）"""
+    prev = [0] * (len(b) + 1) if substring else list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > bound:
+            return bound + 1
+        prev = cur
+    distance = min(prev) if substring else prev[-1]
+    return distance if distance <= bound else bound + 1
+
+
+class RecipeNameIndex:
+    """菜谱名解析：先查大小写折叠后的精确哈希表，再用字符 n-gram 倒排表找候选，最后对少量候选算有界编辑距离排序。
+
+    查询只访问查询 n-gram 对应的倒排表，编辑距离只对 max_candidates 个候选计算，耗时与菜谱总数基本无关。
+    整名匹配得分为 1 - 距离 / 较长者长度；查询只是菜名的一部分（如 "kung pao"）时按子串距离打分，
+    并按查询覆盖菜名的比例打折，保证完整匹配总是排在片段匹配之前。
+    """
+
+    def __init__(self, names: Iterable[str], n: int = 3, max_candidates: int = 20):
+        self.n = n
+        self.max_candidates = max_candidates
+        self.names: List[str] = []
+        self._normalized: List[str] = []
+        self._exact: Dict[str, str] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for name in names:
+            key = normalize_name(name)
+            if not key or key in self._exact:
+                continue
+            self._exact[key] = name
+            name_id = len(self.names)
+            self.names.append(name)
+            self._normalized.append(key)
+            for gram in set(char_ngrams(key, n)):
+                self._postings[gram].append(name_id)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _candidates(self, key: str) -> List[int]:
+        grams = set(char_ngrams(key, self.n))
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        # Dice 系数：2 * 共有 n-gram 数 / (两者 n-gram 数之和)
+        return nlargest(self.max_candidates, shared,
+                        key=lambda i: 2 * shared[i] / (len(grams) + len(self._normalized[i]) + 3 - self.n))
+
+    def _score(self, key: str, name_id: int) -> float:
+        name = self._normalized[name_id]
+        bound = max(1, len(key) // 3)
+        full = edit_distance(key, name, bound)
+        score = 1.0 - full / max(len(key), len(name)) if full <= bound else 0.0
+        if len(key) < len(name):
+            partial = edit_distance(key, name, bound, substring=True)
+            if partial <= bound:
+                coverage = len(key) / len(name)
+                score = max(score, (1.0 - partial / len(key)) * (0.5 + 0.4 * coverage))
+        return score
+
+    def resolve(self, query: str, top_k: int = 3, min_score: float = 0.4) -> List[Tuple[str, float]]:
+        """返回最匹配的 top_k 个 (规范菜谱名, 得分)，得分在 0~1 之间，精确匹配为 1.0"""
+        key = normalize_name(query)
+        if not key:
+            return []
+        exact = self._exact.get(key)
+        if exact is not None:
+            return [(exact, 1.0)]
+        scored = [(self.names[i], self._score(key, i)) for i in self._candidates(key)]
+        return nlargest(top_k, [(name, s) for name, s in scored if s >= min_score], key=lambda item: item[1])
+
+    def best(self, query: str, min_score: float = 0.4) -> Optional[str]:
+        matches = self.resolve(query, top_k=1, min_score=min_score)
+        return matches[0][0] if matches else None
+
+
+# 菜名索引只依赖菜谱名列表，构建很快，不单独持久化
+def get_name_index(index) -> RecipeNameIndex:
+    return attached(index, "name_index", lambda: RecipeNameIndex(get_recipe_store(index).names()))
+
+
+def invalidate_name_index(index) -> None:
+    detach(index, "name_index")
+
+
+def resolve_recipe_name(index, query: str, min_score: float = 0.4) -> Optional[str]:
+    """把用户给出的菜名（大小写、拼写错误、片段）解析成索引中的规范菜谱名；无足够接近的菜谱时返回 None"""
+    return get_name_index(index).best(query, min_score=min_score)
@@ -1,41 +1,226 @@
 # core/prepare.py
-from llama_index.core import Document, VectorStoreIndex
+import asyncio
+import time
+from llama_index.core import Document, VectorStoreIndex, Settings, StorageContext
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.schema import MetadataMode
 from llama_index.core.ingestion import IngestionPipeline
-from llama_index.core.node_parser import TokenTextSplitter
-from llama_index.core.extractors import TitleExtractor, KeywordExtractor
-from typing import List, Dict
+from llama_index.core.extractors import TitleExtractor, KeywordExtractor, SummaryExtractor
+from core.extractors import TfidfMetadataExtractor
+from typing import Callable, List, Dict, Optional, Iterable, Iterator, Tuple, Union
 
-def prepare_documents(recipe_data: Dict) -> List[Document]:
-    docs = []
-    for name, details in recipe_data.items():
-        text = f"""Recipe: {name}
+RECIPE_FIELDS = ("level", "total_time", "prep_time", "cook_time", "servings")
 
-Level: {details.get('level', '-')}
-Total Time: {details.get('total_time', '-')}
-Prep Time: {details.get('prep_time', '-')}
-Cook Time: {details.get('cook_time', '-')}
-Servings: {details.get('servings', '-')}
+# 把原始菜谱解析成结构化记录；数据源里配料/步骤的键既有 ingredient/step 也有 ingredients/steps
+def parse_recipe_record(name: str, details: Dict) -> Dict:
+    record = {"name": name}
+    for field in RECIPE_FIELDS:
+        record[field] = details.get(field, '-')
+    record["ingredients"] = list(details.get('ingredient', details.get('ingredients', [])))
+    record["steps"] = list(details.get('step', details.get('steps', [])))
+    return record
+
+def recipe_record_text(record: Dict) -> str:
+    text = f"""Recipe: {record['name']}
+
+Level: {record['level']}
+Total Time: {record['total_time']}
+Prep Time: {record['prep_time']}
+Cook Time: {record['cook_time']}
+Servings: {record['servings']}
 
 Ingredients:
-{', '.join(details.get('ingredient', []))}
+{', '.join(record['ingredients'])}
 
 Steps:
-{' '.join(details.get('step', []))}
+{' '.join(record['steps'])}
 """
-        docs.append(Document(text=text.strip(), metadata={"recipe_name": name}))
-    return docs
-
-def build_index(docs: List[Document]) -> VectorStoreIndex:
-    text_splitter = TokenTextSplitter(separator=" ", chunk_size=512, chunk_overlap=20)
-    title_extractor = TitleExtractor(nodes=5)
-    keyword_extractor = KeywordExtractor(keywords=5)
-
-    pipeline = IngestionPipeline(transformations=[
-        text_splitter, title_extractor, keyword_extractor
-    ])
-    
+    return text.strip()
+
+# 逐条生成 Document，recipe_items 可以是 dict 或 (菜谱名, 详情) 的迭代器（例如流式读取的文件）
+# on_record 会收到与每个 Document 对应的结构化记录，用于写入菜谱记录表
+def iter_documents(recipe_items: Union[Dict, Iterable[Tuple[str, Dict]]],
+                   on_record: Optional[Callable[[Dict], None]] = None) -> Iterator[Document]:
+    if isinstance(recipe_items, dict):
+        recipe_items = recipe_items.items()
+    for name, details in recipe_items:
+        record = parse_recipe_record(name, details)
+        if on_record is not None:
+            on_record(record)
+        yield Document(text=recipe_record_text(record), metadata={"recipe_name": name})
+
+def prepare_documents(recipe_data: Union[Dict, Iterable[Tuple[str, Dict]]],
+                      on_record: Optional[Callable[[Dict], None]] = None) -> List[Document]:
+    return list(iter_documents(recipe_data, on_record))
+
+# 默认切分与 Settings 一致（SentenceSplitter，chunk_size / chunk_overlap 取 Settings），
+# 应用启动、离线构建和增量更新走同一套切分，同一语料得到相同的节点
+def default_transformations() -> list:
+    return list(Settings.transformations)
+
+# 切分配置的可序列化描述，写入索引清单；与当前配置不一致时索引需要完整重建
+def transformations_config(transformations: Optional[list] = None) -> List[Dict]:
+    return [t.to_dict() if hasattr(t, "to_dict") else {"class_name": type(t).__name__}
+            for t in (transformations or default_transformations())]
+
+def default_extractors() -> list:
+    # 进度由 extract_metadata_concurrently 统一汇报
+    title_extractor = TitleExtractor(nodes=5, show_progress=False)
+    keyword_extractor = KeywordExtractor(keywords=5, show_progress=False)
+    return [title_extractor, keyword_extractor]
+
+# 需要看到同一文档全部节点的抽取器（标题由多个节点合成、摘要引用前后节点），按文档分组调用；其余逐节点调用
+DOCUMENT_LEVEL_EXTRACTORS = (TitleExtractor, SummaryExtractor)
+
+def _llm_calls(extractor, group: list) -> int:
+    # TitleExtractor 对前 nodes 个节点各调用一次，再调用一次合成标题
+    if isinstance(extractor, TitleExtractor):
+        return min(len(group), extractor.nodes) + 1
+    return len(group)
+
+async def _aextract_group(extractor, group: list, semaphore: asyncio.Semaphore, timeout: float):
+    # 超时按任务内的 LLM 调用次数放大，单次调用超过 timeout 秒时整个任务才会超时
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(extractor.aextract(group), timeout=timeout * _llm_calls(extractor, group))
+        except Exception as e:
+            reason = "超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+            print(f"[WARN] {extractor.class_name()} 处理节点失败（{reason}），跳过: {[n.node_id for n in group]}")
+            return None
+
+# 以有界并发执行元数据抽取：逐节点（文档级抽取器按文档分组）生成独立任务，信号量限制同时在途的 LLM 调用数。
+# 抽取器自身的 num_workers 会被置为 1，避免在信号量之内再并发，实际并发不超过 num_workers
+def extract_metadata_concurrently(nodes: list, extractors: list, num_workers: int = 8,
+                                  timeout: float = 120.0, log_every: int = 50) -> list:
+    if not nodes or not extractors:
+        return nodes
+
+    groups: Dict[str, list] = {}
+    for node in nodes:
+        groups.setdefault(node.ref_doc_id or node.node_id, []).append(node)
+    jobs = []
+    for extractor in extractors:
+        extractor.num_workers = 1
+        if isinstance(extractor, DOCUMENT_LEVEL_EXTRACTORS):
+            jobs.extend((extractor, group) for group in groups.values())
+        else:
+            jobs.extend((extractor, [node]) for node in nodes)
+    start = time.perf_counter()
+
+    async def _run():
+        semaphore = asyncio.Semaphore(num_workers)
+        tasks = {
+            asyncio.ensure_future(_aextract_group(extractor, group, semaphore, timeout)): (extractor, group)
+            for extractor, group in jobs
+        }
+        done_count = 0
+        for future in asyncio.as_completed(list(tasks)):
+            await future
+            done_count += 1
+            if done_count % log_every == 0 or done_count == len(jobs):
+                elapsed = time.perf_counter() - start
+                print(f"[INFO] 元数据抽取进度 {done_count}/{len(jobs)}，{done_count / max(elapsed, 1e-9):.2f} calls/sec")
+        return [(tasks[t], t.result()) for t in tasks]
+
+    failed = set()
+    for (extractor, group), metadata_list in asyncio_run(_run()):
+        if metadata_list is None:
+            failed.update(node.node_id for node in group)
+            continue
+        for node, metadata in zip(group, metadata_list):
+            node.metadata.update(metadata)
+            if not extractor.disable_template_rewrite:
+                node.text_template = extractor.node_text_template
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] 元数据抽取完成：{len(nodes)} 个节点，用时 {elapsed:.2f}s，"
+          f"{len(nodes) / max(elapsed, 1e-9):.1f} nodes/sec")
+    if failed:
+        print(f"[WARN] {len(failed)} 个节点的部分元数据抽取失败: {sorted(failed)}")
+    return nodes
+
+# metadata_mode: "llm" 用 LLM 抽取标题/关键词，"tfidf" 用语料级 TF-IDF（无需 LLM），"none" 不抽取
+def run_ingestion(docs: List[Document], transformations: Optional[list] = None, extractors: Optional[list] = None,
+                  num_workers: int = 8, timeout: float = 120.0, metadata_mode: str = "llm") -> list:
+    pipeline = IngestionPipeline(transformations=transformations or default_transformations())
+
     nodes = pipeline.run(documents=docs)
     print(f"[INFO] Ingestion 完成，生成 {len(nodes)} 个节点")
 
-    index = VectorStoreIndex(nodes)
+    if metadata_mode == "llm":
+        extractors = default_extractors() if extractors is None else extractors
+        extract_metadata_concurrently(nodes, extractors, num_workers=num_workers, timeout=timeout)
+    elif metadata_mode == "tfidf":
+        start = time.perf_counter()
+        for extractor in extractors or [TfidfMetadataExtractor()]:
+            extractor(nodes)
+        print(f"[INFO] TF-IDF 元数据抽取完成：{len(nodes)} 个节点，用时 {time.perf_counter() - start:.2f}s")
+    elif metadata_mode != "none":
+        raise ValueError(f"Unknown metadata_mode: {metadata_mode}")
+    return nodes
+
+async def _aembed_batch(embed_model, texts: List[str], semaphore: asyncio.Semaphore,
+                        max_retries: int, backoff: float) -> List[List[float]]:
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            try:
+                return await embed_model.aget_text_embedding_batch(texts)
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = backoff * (2 ** attempt)
+                print(f"[WARN] 嵌入请求失败（第 {attempt + 1} 次），{delay:.1f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+
+# 按批并发嵌入节点：batch_size 控制每批文本数，concurrency 控制同时在途的批次数
+def embed_nodes_concurrently(nodes: list, embed_model=None, batch_size: int = 32, concurrency: int = 4,
+                             max_retries: int = 3, backoff: float = 1.0) -> list:
+    embed_model = embed_model or Settings.embed_model
+    pending = [n for n in nodes if n.embedding is None]
+    if not pending:
+        return nodes
+
+    async def _run():
+        semaphore = asyncio.Semaphore(concurrency)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        results = await asyncio.gather(*[
+            _aembed_batch(embed_model, [n.get_content(metadata_mode=MetadataMode.EMBED) for n in batch],
+                          semaphore, max_retries, backoff)
+            for batch in batches
+        ])
+        for batch, embeddings in zip(batches, results):
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+
+    start = time.perf_counter()
+    asyncio_run(_run())
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] 嵌入完成：{len(pending)} 个节点，用时 {elapsed:.2f}s，"
+          f"{len(pending) / max(elapsed, 1e-9):.1f} nodes/sec")
+    return nodes
+
+# 按批构建索引：每批文档处理、嵌入后立即写入索引，中间结果不会在内存中累积
+def build_index_from_batches(batches: Iterable[List[Document]], transformations: Optional[list] = None,
+                             extractors: Optional[list] = None, embed_batch_size: int = 32, embed_concurrency: int = 4,
+                             extract_workers: int = 8, metadata_mode: str = "llm",
+                             vector_store=None, docstore=None) -> VectorStoreIndex:
+    # vector_store / docstore 为空时使用 llama_index 默认的 SimpleVectorStore / SimpleDocumentStore
+    storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store)
+    index = VectorStoreIndex(nodes=[], storage_context=storage_context)
+    total = 0
+    for docs in batches:
+        nodes = run_ingestion(docs, transformations, extractors, num_workers=extract_workers, metadata_mode=metadata_mode)
+        embed_nodes_concurrently(nodes, batch_size=embed_batch_size, concurrency=embed_concurrency)
+        index.insert_nodes(nodes)
+        # 记录每个文档的哈希，增量更新时据此判断菜谱是否变化
+        index.docstore.set_document_hashes({doc.id_: doc.hash for doc in docs})
+        total += len(docs)
+        print(f"[INFO] 已写入 {total} 个菜谱")
     return index
+
+def build_index(docs: List[Document], transformations: Optional[list] = None, extractors: Optional[list] = None,
+                embed_batch_size: int = 32, embed_concurrency: int = 4, extract_workers: int = 8,
+                metadata_mode: str = "llm", vector_store=None, docstore=None) -> VectorStoreIndex:
+    return build_index_from_batches([docs], transformations, extractors, embed_batch_size=embed_batch_size,
+                                    embed_concurrency=embed_concurrency, extract_workers=extract_workers,
+                                    metadata_mode=metadata_mode, vector_store=vector_store, docstore=docstore)
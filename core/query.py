@@ -1,24 +1,64 @@
 from llama_index.core import Settings
-from llama_index.core.chat_engine import CondenseQuestionChatEngine
-from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.chat_engine import CondensePlusContextChatEngine
 from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
-from llama_index.core import get_response_synthesizer
-from sklearn.metrics.pairwise import cosine_similarity
+from llama_index.core.schema import QueryBundle
 
-from typing import List
+from core.answer_cache import get_answer_cache
+from core.engines import get_filtered_query_engine, get_query_engine, get_retriever
+from core.ingredient_index import get_ingredient_index
+from core.keyword_index import KEYWORD_FIELD, get_keyword_index
+from core.knn_graph import get_knn_graph
+from core.name_index import resolve_recipe_name
+from core.similarity import get_recipe_vectors
 
-# 单轮简单查询
-def query_answer(query: str, index) -> str:
-    query_engine = index.as_query_engine()
-    response = query_engine.query(query)
-    return str(response)
+from typing import Iterator, List, Optional, Tuple
 
-# 多轮对话（带记忆）
-def init_chat_engine(index):
-    memory = ChatMemoryBuffer.from_defaults(token_limit=3900)
-    chat_engine = index.as_chat_engine(
-        chat_mode="condense_plus_context",
+# 单轮简单查询
+# 先查语义答案缓存，相近的问题直接返回缓存答案；查询向量同时交给检索器，未命中时不重复嵌入
+# retrieval="hybrid" 时向量检索与 BM25 按倒数排名融合，菜名、食材等精确词也能命中
+def query_answer(query: str, index, use_cache: bool = True, retrieval: str = "vector") -> str:
+    query_engine = get_query_engine(index, retrieval=retrieval)
+    if not use_cache:
+        return str(query_engine.query(query))
+
+    embedding = Settings.embed_model.get_query_embedding(query)
+    cache = get_answer_cache(index, retrieval)
+    answer = cache.lookup(embedding)
+    if answer is None:
+        answer = str(query_engine.query(QueryBundle(query, embedding=embedding)))
+        cache.put(query, embedding, answer)
+    return answer
+
+# 流式单轮查询：返回 (答案片段生成器, 来源节点)；检索在返回前完成，答案随 LLM 生成逐段产出。
+# 语义缓存命中时整段答案作为一个片段返回，来源为空；未命中时生成结束后把完整答案写入缓存
+def stream_query_answer(query: str, index, use_cache: bool = True,
+                        retrieval: str = "vector") -> Tuple[Iterator[str], list]:
+    query_engine = get_query_engine(index, retrieval=retrieval, streaming=True)
+    if not use_cache:
+        response = query_engine.query(query)
+        return response.response_gen, response.source_nodes
+
+    embedding = Settings.embed_model.get_query_embedding(query)
+    cache = get_answer_cache(index, retrieval)
+    answer = cache.lookup(embedding)
+    if answer is not None:
+        return iter([answer]), []
+    response = query_engine.query(QueryBundle(query, embedding=embedding))
+
+    def tokens() -> Iterator[str]:
+        parts = []
+        for token in response.response_gen:
+            parts.append(token)
+            yield token
+        cache.put(query, embedding, "".join(parts))
+
+    return tokens(), response.source_nodes
+
+# 多轮对话（带记忆）；传入 memory 时与其他聊天引擎共用同一段对话历史
+def init_chat_engine(index, retrieval: str = "vector", memory=None):
+    memory = memory or ChatMemoryBuffer.from_defaults(token_limit=3900)
+    chat_engine = CondensePlusContextChatEngine.from_defaults(
+        retriever=get_retriever(index, retrieval=retrieval),
         memory=memory,
         system_prompt=(
             "您是一位专业厨师助手，请根据菜谱数据库回答用户问题。\n"
@@ -31,29 +71,30 @@ def init_chat_engine(index):
     )
     return chat_engine
 
+# 每种检索方式一个聊天引擎，共用同一段对话记忆，按请求切换检索方式时不丢失上下文
+def init_chat_engines(index, retrievals=("vector", "hybrid")) -> dict:
+    memory = ChatMemoryBuffer.from_defaults(token_limit=3900)
+    return {retrieval: init_chat_engine(index, retrieval=retrieval, memory=memory) for retrieval in retrievals}
+
 def chat_turn(query: str, chat_engine) -> str:
     response = chat_engine.chat(query)
     return str(response)
 
+# 流式对话：返回 (回答片段生成器, 来源节点)；生成器读完后本轮问答才写入对话记忆
+def stream_chat_turn(query: str, chat_engine) -> Tuple[Iterator[str], list]:
+    response = chat_engine.stream_chat(query)
+    return response.response_gen, response.source_nodes
+
 # 关键词匹配检索（需要自己实现 get_keywords_from_llama）
-def keyword_based_answer(query: str, index, get_keywords_from_llama_fn) -> str:
+def keyword_based_answer(query: str, index, get_keywords_from_llama_fn, condition: str = "and",
+                         retrieval: str = "vector") -> str:
     keywords = get_keywords_from_llama_fn(query)
-    
-    filters_list = [
-        MetadataFilter(key="excerpt_keywords", value=k, operator="contains")
-        for k in keywords
-    ]
-    filters = MetadataFilters(filters=filters_list)
-    
-    retriever = index.as_retriever(filters=filters)
-    synthesizer = get_response_synthesizer(response_mode="compact")
-    
-    query_engine = RetrieverQueryEngine(
-        retriever=retriever, 
-        response_synthesizer=synthesizer
-    )
-    
-    response = query_engine.query(query)
+
+    # 复用按过滤模板缓存的引擎，每次只传入关键词；关键词先经倒排索引解析成候选节点，
+    # condition="and" 要求节点包含全部关键词，"or" 包含任一即可
+    query_engine = get_filtered_query_engine(index, KEYWORD_FIELD, operator="contains", condition=condition,
+                                             candidate_index=get_keyword_index(index), retrieval=retrieval)
+    response = query_engine.query(query, keywords)
     return str(response)
 
 
@@ -71,70 +112,97 @@ def suggest_recipes_by_query(query: str, index, model: str = "tinyllama:1.1b", t
 
     print(f"[INFO] Extracted ingredients: {ingredients}")
 
-    # 2. 使用原先逻辑匹配菜谱
-    docstore = index.storage_context.docstore
-    nodes = list(docstore.docs.values())
-
-    matches = []
-    for node in nodes:
-        recipe_name = node.metadata.get("recipe_name", "Unknown")
-        if "Ingredients:" in node.text and "Steps:" in node.text:
-            ingredients_section = node.text.split("Ingredients:")[1].split("Steps:")[0]
-            score = sum(1 for ing in ingredients if ing.lower() in ingredients_section.lower())
-            if score > 0:
-                matches.append((recipe_name, score))
+    # 2. 在食材倒排索引中匹配菜谱
+    matches = get_ingredient_index(index).match(ingredients, top_k=top_k)
+    return format_query_suggestions(matches)
 
-    matches.sort(key=lambda x: x[1], reverse=True)
 
+def format_query_suggestions(matches: List[Tuple[str, int]]) -> str:
     result_descriptions = [
         f"- Suggested recipe: {name} (matched ingredients: {score})"
-        for name, score in matches[:top_k]
+        for name, score in matches
     ]
     return "\n".join(result_descriptions) if result_descriptions else "No matching recipes found."
 
 
-def suggest_recipes_by_ingredients(available_ingredients, index, top_k=3):
-    docstore = index.storage_context.docstore
-    nodes = list(docstore.docs.values())
+# 批量版 suggest_recipes_by_query：逐条抽取食材后在食材倒排索引上一次性打分，结果与 queries 顺序一致
+def suggest_recipes_by_queries(queries: List[str], index, model: str = "tinyllama:1.1b", top_k=3) -> List[str]:
+    from core.utils import get_keywords_from_llama
+
+    ingredient_sets = [get_keywords_from_llama(query, model=model) for query in queries]
+    matches = get_ingredient_index(index).match_many(ingredient_sets, top_k=top_k)
+    return [
+        format_query_suggestions(m) if ingredients else "Failed to extract keywords from the input."
+        for ingredients, m in zip(ingredient_sets, matches)
+    ]
 
-    matches = []
-    for node in nodes:
-        recipe_name = node.metadata.get("recipe_name", "Unknown")
-        if "Ingredients:" in node.text and "Steps:" in node.text:
-            ingredients_section = node.text.split("Ingredients:")[1].split("Steps:")[0]
-            score = sum(1 for ing in available_ingredients if ing.lower() in ingredients_section.lower())
-            if score > 0:
-                matches.append((recipe_name, score))
 
-    matches.sort(key=lambda x: x[1], reverse=True)
+# 按食材倒排索引打分，只访问查询食材对应的倒排表
+def suggest_recipes_by_ingredients(available_ingredients, index, top_k=3):
+    matches = get_ingredient_index(index).match(available_ingredients, top_k=top_k)
+    return format_ingredient_suggestions(matches)
+
 
+def format_ingredient_suggestions(matches: List[Tuple[str, int]]) -> str:
     if not matches:
         return "Sorry, I couldn't find any recipes matching your ingredients."
 
     response_lines = [
         f"- I recommend trying '{name}', which matches {score} of your ingredients."
-        for name, score in matches[:top_k]
+        for name, score in matches
     ]
     return "\n".join(response_lines)
 
+
+# 批量版 suggest_recipes_by_ingredients：所有食材组合共用一次倒排表查找
+def suggest_recipes_by_ingredient_sets(ingredient_sets: List[List[str]], index, top_k=3) -> List[str]:
+    matches = get_ingredient_index(index).match_many(ingredient_sets, top_k=top_k)
+    return [format_ingredient_suggestions(m) for m in matches]
+
+# 相似菜谱 (菜谱名, 相似度) 列表：优先查预先计算的相似菜谱图，k 超出图的范围时再用菜谱向量矩阵实时计算
+# target_name 先经菜名索引解析成规范菜谱名，允许大小写不同、拼写错误或只给出菜名片段
+def similar_recipes(target_name: str, index, top_k: int = 3) -> Optional[List[Tuple[str, float]]]:
+    return similar_recipes_resolved([resolve_recipe_name(index, target_name)], index, top_k)[0]
+
+# 对已解析成规范菜谱名的目标批量查相似菜谱（不再解析菜名）：先查相似菜谱图，
+# 图中没有的目标合并成一次矩阵乘法计算；名字为 None 的位置结果为 None
+def similar_recipes_resolved(resolved: List[Optional[str]], index,
+                             top_k: int = 3) -> List[Optional[List[Tuple[str, float]]]]:
+    graph = get_knn_graph(index)
+    results = [graph.similar_to(name, top_k) if name is not None else None for name in resolved]
+    missing = [i for i, (name, r) in enumerate(zip(resolved, results)) if name is not None and r is None]
+    if missing:
+        computed = get_recipe_vectors(index).similar_to_many([resolved[i] for i in missing], top_k)
+        for i, r in zip(missing, computed):
+            results[i] = r
+    return results
+
 # 找与某道菜相似的其它菜
-def find_similar_recipes(target_name, index, embed_model, top_k=3):
-    docstore = index.storage_context.docstore
-    nodes = list(docstore.docs.values())
+# 直接复用向量存储里已有的节点向量，不再逐个节点调用嵌入模型；embed_model 仅为兼容旧调用保留
+def find_similar_recipes(target_name, index, embed_model=None, top_k=3):
+    resolved = resolve_recipe_name(index, target_name)
+    results = similar_recipes_resolved([resolved], index, top_k)[0]
+    return format_similar_recipes(target_name, resolved, results)
 
-    target_node = next((n for n in nodes if n.metadata.get("recipe_name") == target_name), None)
-    if not target_node:
-        return f"No recipe found with the name '{target_name}'."
 
-    target_vec = embed_model._get_text_embedding(target_node.text)
-    all_vecs = [embed_model._get_text_embedding(n.text) for n in nodes]
-    scores = cosine_similarity([target_vec], all_vecs)[0]
+# 批量版 find_similar_recipes，结果与 target_names 顺序一致
+def find_similar_recipes_batch(target_names: List[str], index, top_k=3) -> List[str]:
+    resolved = [resolve_recipe_name(index, name) for name in target_names]
+    results = similar_recipes_resolved(resolved, index, top_k)
+    return [format_similar_recipes(*item) for item in zip(target_names, resolved, results)]
+
+
+def format_similar_recipes(target_name: str, resolved: Optional[str],
+                           results: Optional[List[Tuple[str, float]]]) -> str:
+    if results is None:
+        return f"No recipe found with the name '{target_name}'."
 
-    sorted_results = sorted(zip(nodes, scores), key=lambda x: x[1], reverse=True)
     similar_list = [
-        f"- Similar recipe: {n.metadata['recipe_name']} (similarity score: {s:.2f})"
-        for n, s in sorted_results[1:top_k+1]
+        f"- Similar recipe: {name} (similarity score: {s:.2f})"
+        for name, s in results
     ]
+    if similar_list and resolved != target_name:
+        similar_list.insert(0, f"Recipes similar to '{resolved}':")
     return "\n".join(similar_list) if similar_list else "No similar recipes found."
 
 
@@ -0,0 +1,157 @@
+# core/recipes.py
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from core.docstore import iter_docstore_nodes
+from core.registry import attach, attached
+
+RECIPES_FILE = "recipes.sqlite"
+
+
+class RecipeStore:
+    """结构化菜谱记录表（配料列表、步骤列表、时间、份量），按菜谱名主键查询，不需要解析节点文本"""
+
+    def __init__(self, path: str = ":memory:", flush_every: int = 500):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60.0)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS recipes (name TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        self._conn.commit()
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, reset: bool = False) -> "RecipeStore":
+        store = cls(os.path.join(persist_dir, RECIPES_FILE))
+        if reset:
+            store.clear()
+        return store
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, RECIPES_FILE))
+
+    def add(self, record: Dict) -> None:
+        """写入（或覆盖）一条记录；先缓冲，满 flush_every 条时批量提交"""
+        with self._lock:
+            self._pending[record["name"]] = json.dumps(record, ensure_ascii=False)
+            full = len(self._pending) >= self.flush_every
+        if full:
+            self.flush()
+
+    def add_many(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.add(record)
+        self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._conn.executemany("INSERT OR REPLACE INTO recipes (name, record) VALUES (?, ?)",
+                                       list(self._pending.items()))
+                self._conn.commit()
+                self._pending = {}
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            pending = self._pending.get(name)
+            if pending is not None:
+                return json.loads(pending)
+            row = self._conn.execute("SELECT record FROM recipes WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, names: List[str]) -> Dict[str, Dict]:
+        self.flush()
+        found = {}
+        with self._lock:
+            for i in range(0, len(names), 500):
+                batch = names[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT name, record FROM recipes WHERE name IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((name, json.loads(record)) for name, record in rows)
+        return found
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def names(self) -> List[str]:
+        self.flush()
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM recipes ORDER BY name")]
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self._pending.pop(name, None)
+            self._conn.execute("DELETE FROM recipes WHERE name = ?", (name,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending = {}
+            self._conn.execute("DELETE FROM recipes")
+            self._conn.commit()
+
+    def save(self, persist_dir: str) -> None:
+        """保存到 persist_dir；本身就在该目录时只需提交缓冲"""
+        self.flush()
+        target = os.path.join(persist_dir, RECIPES_FILE)
+        if self.path != ":memory:" and os.path.abspath(target) == os.path.abspath(self.path):
+            return
+        os.makedirs(persist_dir, exist_ok=True)
+        conn = sqlite3.connect(target)
+        with self._lock:
+            self._conn.backup(conn)
+        conn.close()
+
+
+def parse_recipe_text(text: str) -> Dict:
+    """从节点文本反解析记录，只用于没有记录表的旧索引；配料中自带的逗号无法还原"""
+    record = {"ingredients": [], "steps": []}
+    head, _, rest = text.partition("Ingredients:")
+    for line in head.splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            record[key.strip().lower().replace(" ", "_")] = value.strip()
+    if "recipe" in record:
+        record["name"] = record.pop("recipe")
+    ingredients, _, steps = rest.partition("Steps:")
+    record["ingredients"] = [i.strip() for i in ingredients.split(", ") if i.strip()]
+    record["steps"] = [s.strip() for s in re.split(r"(?<=[.!?])\s+", steps) if s.strip()]
+    return record
+
+
+def attach_recipe_store(index, recipe_store: RecipeStore) -> None:
+    attach(index, "recipe_store", recipe_store)
+
+
+def _recipe_store_from_docstore(docstore) -> RecipeStore:
+    recipe_store = RecipeStore()
+    for node in iter_docstore_nodes(docstore):
+        name = node.metadata.get("recipe_name")
+        if name is not None and "Ingredients:" in node.get_content():
+            recipe_store.add({**parse_recipe_text(node.get_content()), "name": name})
+    recipe_store.flush()
+    return recipe_store
+
+
+def get_recipe_store(index, from_docstore: bool = True) -> Optional[RecipeStore]:
+    """取索引对应的菜谱记录表；旧索引没有记录表时从 docstore 的节点文本反解析一次并缓存在内存中，
+    from_docstore=False 时直接返回 None"""
+    factory = (lambda: _recipe_store_from_docstore(index.storage_context.docstore)) if from_docstore else None
+    return attached(index, "recipe_store", factory)
+
+
+def get_recipe_record(index, name: str) -> Optional[Dict]:
+    return get_recipe_store(index).get(name)
@@ -0,0 +1,60 @@
+# core/registry.py
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+# 挂在 VectorStoreIndex 上的派生结构（倒排索引、BM25、菜谱记录表、相似图、查询引擎等），统一在这里存取。
+# 直接存放在索引对象自身的属性里而不是弱引用字典：引擎等对象会引用索引，放在弱引用字典的值里会让索引无法释放；
+# 挂在索引上则随索引一起释放，重新加载或重建索引得到新对象时自然失效。
+_ATTR = "_attached"
+_LOCKS_ATTR = "_attached_locks"
+# 全局锁只保护字典本身的读写，持有时间很短；构建在每个 (索引, key) 各自的锁内进行，
+# 一个结构的懒构建不会阻塞其他索引或其他 key 的存取。
+# 每个 key 的锁可重入：构建函数内部常常还要取同一索引上的其他结构（如菜名索引依赖菜谱记录表）
+_LOCK = threading.Lock()
+
+
+def _key_lock(index, key: Hashable) -> threading.RLock:
+    with _LOCK:
+        locks = index.__dict__.setdefault(_LOCKS_ATTR, {})
+        lock = locks.get(key)
+        if lock is None:
+            lock = locks[key] = threading.RLock()
+        return lock
+
+
+def _lookup(index, key: Hashable, valid: Optional[Callable[[Any], bool]]) -> Any:
+    with _LOCK:
+        value = index.__dict__.setdefault(_ATTR, {}).get(key)
+    if value is not None and (valid is None or valid(value)):
+        return value
+    return None
+
+
+def attached(index, key: Hashable, factory: Optional[Callable[[], Any]] = None,
+             valid: Optional[Callable[[Any], bool]] = None) -> Any:
+    """取索引上 key 对应的对象。
+
+    不存在（或 valid 判定已过期）且给出 factory 时在该 key 的锁内构建一次并挂上，并发请求不会重复构建；
+    没有 factory 时返回 None。
+    """
+    value = _lookup(index, key, valid)
+    if value is not None or factory is None:
+        return value
+    with _key_lock(index, key):
+        # 等锁期间可能已由其他线程构建好
+        value = _lookup(index, key, valid)
+        if value is None:
+            value = factory()
+            attach(index, key, value)
+        return value
+
+
+def attach(index, key: Hashable, value: Any) -> None:
+    with _LOCK:
+        index.__dict__.setdefault(_ATTR, {})[key] = value
+
+
+def detach(index, key: Hashable) -> Any:
+    with _LOCK:
+        return index.__dict__.get(_ATTR, {}).pop(key, None)
+
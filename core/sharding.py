@@ -0,0 +1,118 @@
+# core/sharding.py
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.llms.ollama import Ollama
+
+from core.embedding import get_embed_model
+from core.extractors import TfidfMetadataExtractor
+from core.loader import iter_document_batches, iter_recipes
+from core.prepare import embed_nodes_concurrently, iter_documents, run_ingestion
+
+
+# 子进程内的模型与抽取器，由 _init_shard_worker 在进程启动时设置一次
+_WORKER: Dict = {}
+
+
+def _init_shard_worker(shard_id: int, config: Dict) -> None:
+    """子进程初始化：每个分片进程只创建一次嵌入模型、LLM、切分器和抽取器"""
+    Settings.embed_model = get_embed_model(config["embed_model"], base_url=config["embed_base_url"])
+    if config["metadata_mode"] == "llm":
+        Settings.llm = Ollama(model=config["llm_model"], request_timeout=600.0)
+
+    transformations = None
+    if config.get("chunk_size"):
+        transformations = [SentenceSplitter(chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"])]
+    extractors = None
+    if config.get("tfidf_state") is not None:
+        extractors = [TfidfMetadataExtractor.from_fitted_state(config["tfidf_state"])]
+    _WORKER.update(shard_id=shard_id, config=config, transformations=transformations, extractors=extractors)
+
+
+def _build_batch(items: List[Tuple[str, Dict]]) -> Dict:
+    """子进程入口：对主进程分发来的一批菜谱做文档准备、切分、元数据抽取和嵌入，返回已嵌入的节点"""
+    config = _WORKER["config"]
+    start = time.perf_counter()
+    docs = list(iter_documents(items))
+    nodes = run_ingestion(docs, _WORKER["transformations"], _WORKER["extractors"],
+                          metadata_mode=config["metadata_mode"])
+    embed_nodes_concurrently(nodes, batch_size=config["embed_batch_size"], concurrency=config["embed_concurrency"])
+    return {"shard_id": _WORKER["shard_id"], "nodes": nodes,
+            "doc_hashes": {doc.id_: doc.hash for doc in docs}, "elapsed": time.perf_counter() - start}
+
+
+# 多进程分片构建：主进程只流式读取一次文件，按 batch_size 条切块后轮流分给各分片进程
+# （每个分片可分别指向不同的嵌入服务），每块完成后立即在主进程合并进索引
+def build_index_sharded(json_path: str, num_shards: int, embed_base_urls: Optional[List[str]] = None,
+                        embed_model: str = "nomic-embed-text", llm_model: str = "qwen:7b",
+                        metadata_mode: str = "llm", batch_size: int = 256, embed_batch_size: int = 32,
+                        embed_concurrency: int = 4, chunk_size: Optional[int] = None, chunk_overlap: int = 200,
+                        vector_store=None, docstore=None) -> VectorStoreIndex:
+    embed_base_urls = embed_base_urls or ["http://localhost:11434"]
+    tfidf_state = None
+    if metadata_mode == "tfidf":
+        # IDF 必须在整个语料上拟合，先在主进程流式拟合一次再分发给各分片
+        corpus = (doc.text for batch in iter_document_batches(json_path, batch_size) for doc in batch)
+        tfidf_state = TfidfMetadataExtractor(corpus=corpus).fitted_state
+
+    base_config = {
+        "embed_model": embed_model, "llm_model": llm_model, "metadata_mode": metadata_mode,
+        "batch_size": batch_size, "embed_batch_size": embed_batch_size, "embed_concurrency": embed_concurrency,
+        "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "tfidf_state": tfidf_state,
+    }
+
+    storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store)
+    index = VectorStoreIndex(nodes=[], storage_context=storage_context)
+    start = time.perf_counter()
+    node_counts: Counter = Counter()
+    busy: Counter = Counter()
+
+    def merge(done) -> None:
+        for future in done:
+            result = future.result()
+            index.insert_nodes(result["nodes"])
+            index.docstore.set_document_hashes(result["doc_hashes"])
+            node_counts[result["shard_id"]] += len(result["nodes"])
+            print(f"[INFO] 分片 {result['shard_id']} 合并一批：{len(result['nodes'])} 个节点，"
+                  f"用时 {result['elapsed']:.2f}s")
+
+    # 显式使用 spawn：子进程不继承父进程的事件循环和 Ollama 客户端连接；
+    # 每个分片一个单进程池，进程初始化时绑定自己的嵌入服务
+    context = multiprocessing.get_context("spawn")
+    executors = [
+        ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_shard_worker,
+                            initargs=(shard_id, {**base_config,
+                                                 "embed_base_url": embed_base_urls[shard_id % len(embed_base_urls)]}))
+        for shard_id in range(num_shards)
+    ]
+    pending = {}
+    try:
+        recipes = iter_recipes(json_path)
+        while True:
+            items = list(islice(recipes, batch_size))
+            if not items:
+                break
+            # 每个分片最多排队两块，主进程内存中只保留少量尚未处理的菜谱
+            while len(pending) >= 2 * num_shards:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    busy[pending.pop(future)] -= 1
+                merge(done)
+            shard_id = min(range(num_shards), key=lambda s: busy[s])
+            pending[executors[shard_id].submit(_build_batch, items)] = shard_id
+            busy[shard_id] += 1
+        done, _ = wait(pending)
+        merge(done)
+    finally:
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+
+    print(f"[INFO] 分片构建完成：{num_shards} 个分片，各分片节点数 {dict(sorted(node_counts.items()))}，"
+          f"总用时 {time.perf_counter() - start:.2f}s")
+    return index
@@ -0,0 +1,138 @@
+# core/similarity.py
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.registry import attached, detach
+from core.vector_store import MmapVectorStore
+
+
+def _node_vectors(vector_store) -> Tuple[List[Optional[str]], np.ndarray]:
+    """从向量存储中取出 (每个节点的菜谱名, 节点向量矩阵)，不重新调用嵌入模型"""
+    if isinstance(vector_store, MmapVectorStore):
+        names = [metadata.get("recipe_name") for metadata in vector_store.node_metadata]
+        return names, np.asarray(vector_store.matrix, dtype=np.float32)
+    # llama_index 默认的 SimpleVectorStore
+    data = vector_store.data
+    node_ids = list(data.embedding_dict)
+    names = [(data.metadata_dict.get(node_id) or {}).get("recipe_name") for node_id in node_ids]
+    matrix = np.asarray([data.embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+    return names, matrix
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def topk_rows(matrix: np.ndarray, rows: np.ndarray, k: int,
+              block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """分块计算 rows 中每一行与全部行的 top-k 邻居（排除自身），峰值内存为 block_size × N"""
+    n = matrix.shape[0]
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    kk = min(k, n - 1)
+    if kk <= 0:
+        return neighbors, scores
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        sims = matrix[block_rows] @ matrix.T
+        sims[np.arange(len(block_rows)), block_rows] = -np.inf
+        top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        neighbors[start:start + len(block_rows), :kk] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block_rows), :kk] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+class RecipeVectors:
+    """菜谱级向量矩阵：同一菜谱的多个节点向量取平均后做 L2 归一化，点积即余弦相似度"""
+
+    def __init__(self, names: List[str], matrix: np.ndarray):
+        self.names = names
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.name_to_row: Dict[str, int] = {name: i for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "RecipeVectors":
+        node_names, node_matrix = _node_vectors(vector_store)
+        names: List[str] = []
+        rows = np.empty(len(node_names), dtype=np.int64)
+        name_to_row: Dict[str, int] = {}
+        for i, name in enumerate(node_names):
+            if name is None:
+                rows[i] = -1
+                continue
+            if name not in name_to_row:
+                name_to_row[name] = len(names)
+                names.append(name)
+            rows[i] = name_to_row[name]
+        keep = rows >= 0
+        if not keep.any():
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        sums = np.zeros((len(names), node_matrix.shape[1]), dtype=np.float32)
+        np.add.at(sums, rows[keep], _normalize_rows(node_matrix[keep]))
+        return cls(names, _normalize_rows(sums))
+
+    def vector(self, name: str) -> Optional[np.ndarray]:
+        row = self.name_to_row.get(name)
+        return None if row is None else self.matrix[row]
+
+    def top_k(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[str, float]]:
+        """与归一化查询向量最相似的 k 个菜谱，argpartition 选出候选后只对 k 个结果排序"""
+        if len(self.names) == 0:
+            return []
+        scores = self.matrix @ query
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores) - (exclude is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+    def similar_to(self, name: str, k: int = 3) -> Optional[List[Tuple[str, float]]]:
+        """与菜谱 name 最相似的 k 个其他菜谱；菜谱不存在时返回 None"""
+        row = self.name_to_row.get(name)
+        if row is None:
+            return None
+        return self.top_k(self.matrix[row], k, exclude=row)
+
+    def similar_to_many(self, names: List[str], k: int = 3) -> List[Optional[List[Tuple[str, float]]]]:
+        """批量版 similar_to：所有目标菜谱的向量与整个矩阵一次（分块）矩阵乘法算出 top-k，结果与 names 顺序一致"""
+        rows = [self.name_to_row.get(name) for name in names]
+        found = np.array([row for row in rows if row is not None], dtype=np.int64)
+        neighbors, scores = topk_rows(self.matrix, found, k)
+        results: List[Optional[List[Tuple[str, float]]]] = []
+        i = 0
+        for row in rows:
+            if row is None:
+                results.append(None)
+                continue
+            results.append([(self.names[j], float(s)) for j, s in zip(neighbors[i], scores[i]) if j >= 0])
+            i += 1
+        return results
+
+
+def _node_count(vector_store) -> int:
+    if isinstance(vector_store, MmapVectorStore):
+        return len(vector_store.node_ids)
+    return len(vector_store.data.embedding_dict)
+
+
+def get_recipe_vectors(index) -> RecipeVectors:
+    """取索引对应的菜谱向量矩阵；节点数变化或显式失效时重建"""
+    vector_store = index.vector_store
+    count = _node_count(vector_store)
+    cached = attached(index, "recipe_vectors", lambda: (count, RecipeVectors.from_vector_store(vector_store)),
+                      valid=lambda value: value[0] == count)
+    return cached[1]
+
+
+def invalidate_recipe_vectors(index) -> None:
+    detach(index, "recipe_vectors")
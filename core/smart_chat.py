@@ -1,11 +1,14 @@
-from core.utils import get_keywords_from_llama, extract_number_from_text
-from core.query import suggest_recipes_by_ingredients, find_similar_recipes
+from core.utils import get_keywords_from_llama
+from core.query import suggest_recipes_by_ingredients, similar_recipes
 from core.utils import scale_ingredients, get_last_mentioned_recipe
+from core.recipes import get_recipe_record
+from core.name_index import resolve_recipe_name
+from core.llm_cache import cached_complete, get_llm
+from core.intent import IntentClassifier, SCALE_CUES, SIMILAR_CUES, cue_target, scale_factor
 from llama_index.core import Settings
-from llama_index.llms.ollama import Ollama
 
-# 初始化一个轻量问答判断模型
-llm_router = Ollama(model="tinyllama:1.1b", request_timeout=300.0)
+# 初始化一个轻量问答判断模型（与其他 LLM 辅助函数共享客户端和补全缓存）
+llm_router = get_llm("tinyllama:1.1b", request_timeout=300.0)
 
 # def classify_query(query: str) -> str:
 #     """使用 LLM 判断 query 类型: recommend, similar, scale, chat"""
@@ -29,7 +32,52 @@ llm_router = Ollama(model="tinyllama:1.1b", request_timeout=300.0)
 
 import re
 
-def classify_query(query: str) -> str:
+# 本地意图分类：嵌入原型 + 关键词提示，置信度低于阈值时才请 LLM 判断
+INTENT_THRESHOLD = 0.6
+intent_classifier = IntentClassifier(
+    examples={
+        "recommend": [
+            "What can I cook with chicken and potatoes?",
+            "I have eggs, tomatoes and rice, what should I make?",
+            "Suggest a recipe using beef and broccoli.",
+            "Any dinner ideas with salmon?",
+            "我有土豆和牛肉能做什么菜",
+        ],
+        "similar": [
+            "Show me dishes similar to Kung Pao Chicken.",
+            "What recipes are like lasagna?",
+            "Find something close to chicken tikka masala.",
+            "有没有和宫保鸡丁差不多的菜",
+        ],
+        "scale": [
+            "Change the cake recipe for 12 people instead of 4.",
+            "Double the ingredients.",
+            "How much do I need to make it for 8 servings?",
+            "Cut the recipe in half.",
+            "把这个菜谱的份量减半",
+        ],
+        "tutorial": [
+            "How do I make Chana Masala?",
+            "What are the steps to cook beef stew?",
+            "How to bake banana bread?",
+            "Give me the recipe for pad thai.",
+            "How many servings does lasagna make?",
+            "红烧肉怎么做",
+        ],
+        "chat": [
+            "Who invented the hamburger?",
+            "Hello, how are you?",
+            "Thanks, that was helpful!",
+            "Is olive oil healthier than butter?",
+            "Is baking similar to roasting?",
+            "What is the origin of sushi?",
+        ],
+    },
+    cues={"similar": SIMILAR_CUES, "scale": SCALE_CUES},
+)
+
+
+def classify_query_llm(query: str) -> str:
     prompt = (
         "You are a smart assistant. Classify the user's question into one of the categories:\n"
         "- recommend (if user wants recipe suggestions based on ingredients or keywords)\n"
@@ -46,7 +94,7 @@ def classify_query(query: str) -> str:
         f"User question: {query}\n"
         "Answer format: label: <category>"
     )
-    response = llm_router.complete(prompt).text.strip().lower()
+    response = cached_complete(prompt, llm=llm_router).lower()
     print(f'[DEBUG] LLM raw response: {response}')
     match = re.search(r'label:\s*(\w+)', response)
     if match:
@@ -56,6 +104,15 @@ def classify_query(query: str) -> str:
     return "chat"
 
 
+def classify_query(query: str) -> str:
+    label, confidence = intent_classifier.classify(query)
+    if confidence >= INTENT_THRESHOLD:
+        print(f"[DEBUG] Local intent: {label} (confidence {confidence:.2f})")
+        return label
+    print(f"[DEBUG] Local intent {label} below threshold ({confidence:.2f}), asking LLM")
+    return classify_query_llm(query)
+
+
 def smart_chat_turn(query: str, chat_engine, index, embed_model=None) -> str:
     label = classify_query(query)
     print(f"[INFO] Detected label: {label}")
@@ -68,8 +125,9 @@ def smart_chat_turn(query: str, chat_engine, index, embed_model=None) -> str:
         return f"Based on your input, here are some suggested recipes:\n{response}"
     
     if label == "similar":
-        target = query.lower().split("similar to")[-1].strip()
-        results = find_similar_recipes(target, index, embed_model)
+        # 与命中提示的正则取同一个目标菜名；嵌入分类得到的相似意图再按 "similar to" 切分
+        target = cue_target(query) or query.lower().split("similar to")[-1].strip()
+        results = similar_recipes(target, index)
         if results:
             return "Here are some dishes similar to what you mentioned:\n" + "\n".join(
                 f"- {name} (similarity: {score:.2f})" for name, score in results
@@ -78,13 +136,13 @@ def smart_chat_turn(query: str, chat_engine, index, embed_model=None) -> str:
             return "Sorry, I couldn't find any similar recipes."
     
     if label == "scale":
-        scale_by = extract_number_from_text(query)
+        scale_by = scale_factor(query)
         recipe_id = get_last_mentioned_recipe(chat_engine.memory)
-        if recipe_id and scale_by:
-            doc = index.storage_context.docstore.docs.get(recipe_id)
-            ingredients = doc.text.split("Ingredients:")[1].split("Steps:")[0].split("\n")
-            scaled = scale_ingredients(ingredients, scale_by)
-            return f"Here are the adjusted ingredients for {scale_by}x servings:\n" + "\n".join(scaled)
+        recipe_id = resolve_recipe_name(index, recipe_id) if recipe_id else None
+        record = get_recipe_record(index, recipe_id) if recipe_id else None
+        if record and scale_by:
+            scaled = scale_ingredients(record["ingredients"], scale_by)
+            return f"Here are the adjusted ingredients for {scale_by:g}x servings:\n" + "\n".join(scaled)
         return "I couldn't determine which recipe or scale factor you meant."
     
     # 处理tutorial类别与chat一致
@@ -0,0 +1,292 @@
+# core/storage.py
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from llama_index.core import Settings, StorageContext, VectorStoreIndex, load_index_from_storage
+
+from core.bm25 import BM25_INDEX_FILE, BM25Index, attach_bm25_index, get_bm25_index, invalidate_bm25_index
+from core.docstore import SqliteDocumentStore
+from core.answer_cache import invalidate_answer_cache
+from core.extractors import TfidfMetadataExtractor
+from core.ingredient_index import INGREDIENT_INDEX_FILE, IngredientIndex, attach_ingredient_index, get_ingredient_index
+from core.keyword_index import KEYWORD_INDEX_FILE, KeywordIndex, attach_keyword_index, get_keyword_index
+from core.loader import iter_document_batches, iter_recipes
+from core.recipes import RecipeStore, attach_recipe_store, get_recipe_store
+from core.knn_graph import KNN_GRAPH_FILE, KnnGraph, attach_knn_graph, get_knn_graph
+from core.name_index import invalidate_name_index
+from core.similarity import get_recipe_vectors, invalidate_recipe_vectors
+from core.vector_store import MmapVectorStore
+from core.prepare import (build_index_from_batches, iter_documents, parse_recipe_record, run_ingestion,
+                          embed_nodes_concurrently, transformations_config)
+
+DEFAULT_PERSIST_DIR = "./data/index_storage"
+MANIFEST_FILE = "index_manifest.json"
+
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_embed_model_name(embed_model=None) -> str:
+    embed_model = embed_model or Settings.embed_model
+    return getattr(embed_model, "model_name", type(embed_model).__name__)
+
+
+def read_manifest(persist_dir: str) -> Optional[dict]:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(persist_dir: str, json_path: str, embed_model=None, **extra) -> dict:
+    """记录索引对应的源数据哈希和嵌入模型，供下次启动时校验"""
+    manifest = {
+        "source": os.path.abspath(json_path),
+        "source_sha256": file_sha256(json_path),
+        "embed_model": get_embed_model_name(embed_model),
+        **extra,
+    }
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+def invalidate_manifest(persist_dir: str) -> None:
+    """改动持久化目录中的任何文件之前先删除清单，全部写完后才由 persist_index 重新写入；
+    中途失败时目录里没有清单，下次启动会完整重建，而不是加载只写了一半的索引"""
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def manifest_matches(manifest: dict, embed_model=None, transformations: Optional[list] = None) -> bool:
+    """嵌入模型和切分配置都与当前一致时，已有索引才能直接加载或增量更新；否则必须完整重建"""
+    return (manifest.get("embed_model") == get_embed_model_name(embed_model)
+            and manifest.get("splitter") == transformations_config(transformations))
+
+
+# vector_store: "mmap" 为 float32 内存映射向量文件，"simple" 为 llama_index 默认的 JSON 向量存储
+def make_vector_store(vector_store: str = "mmap"):
+    if vector_store == "mmap":
+        return MmapVectorStore()
+    if vector_store == "simple":
+        return None
+    raise ValueError(f"Unknown vector_store: {vector_store}")
+
+
+# docstore: "sqlite" 为单文件 SQLite（节点文本按需读取），"simple" 为 llama_index 默认的 JSON docstore（加载时全部读入内存）
+def make_docstore(docstore: str = "sqlite", persist_dir: str = DEFAULT_PERSIST_DIR):
+    if docstore == "sqlite":
+        # 重新构建时清空旧内容，避免残留已删除菜谱的节点；清空前先作废清单
+        invalidate_manifest(persist_dir)
+        return SqliteDocumentStore.from_persist_dir(persist_dir, reset=True)
+    if docstore == "simple":
+        return None
+    raise ValueError(f"Unknown docstore: {docstore}")
+
+
+def load_index(persist_dir: str = DEFAULT_PERSIST_DIR) -> VectorStoreIndex:
+    manifest = read_manifest(persist_dir) or {}
+    vector_store = MmapVectorStore.from_persist_dir(persist_dir) if manifest.get("vector_store") == "mmap" else None
+    docstore = SqliteDocumentStore.from_persist_dir(persist_dir) if manifest.get("docstore") == "sqlite" else None
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, docstore=docstore, vector_store=vector_store)
+    index = load_index_from_storage(storage_context)
+    ingredient_index = IngredientIndex.from_persist_dir(persist_dir)
+    if ingredient_index is not None:
+        attach_ingredient_index(index, ingredient_index)
+    keyword_index = KeywordIndex.from_persist_dir(persist_dir)
+    if keyword_index is not None:
+        attach_keyword_index(index, keyword_index)
+    bm25_index = BM25Index.from_persist_dir(persist_dir)
+    if bm25_index is not None:
+        attach_bm25_index(index, bm25_index)
+    if RecipeStore.exists(persist_dir):
+        attach_recipe_store(index, RecipeStore.from_persist_dir(persist_dir))
+    knn_graph = KnnGraph.from_persist_dir(persist_dir)
+    if knn_graph is not None:
+        attach_knn_graph(index, knn_graph)
+    return index
+
+
+def persist_index(index: VectorStoreIndex, json_path: str, persist_dir: str = DEFAULT_PERSIST_DIR,
+                  transformations: Optional[list] = None, **extra):
+    # 清单最后写入，作为整个目录已写完整的标记
+    invalidate_manifest(persist_dir)
+    index.storage_context.persist(persist_dir=persist_dir)
+    # 食材倒排索引随索引一起保存；新建的索引在这里从 docstore 构建
+    get_ingredient_index(index).save(os.path.join(persist_dir, INGREDIENT_INDEX_FILE))
+    get_keyword_index(index).save(os.path.join(persist_dir, KEYWORD_INDEX_FILE))
+    get_bm25_index(index).save(os.path.join(persist_dir, BM25_INDEX_FILE))
+    recipe_store = get_recipe_store(index, from_docstore=False)
+    if recipe_store is None:
+        # 例如分片构建的索引：直接从源文件流式生成菜谱记录表
+        recipe_store = RecipeStore.from_persist_dir(persist_dir, reset=True)
+        recipe_store.add_many(parse_recipe_record(name, details) for name, details in iter_recipes(json_path))
+        attach_recipe_store(index, recipe_store)
+    recipe_store.save(persist_dir)
+    # 相似菜谱图：新建的索引在这里整体计算一次，之后随增量更新维护
+    get_knn_graph(index).save(os.path.join(persist_dir, KNN_GRAPH_FILE))
+    extra.setdefault("vector_store", "mmap" if isinstance(index.vector_store, MmapVectorStore) else "simple")
+    extra.setdefault("docstore", "sqlite" if isinstance(index.docstore, SqliteDocumentStore) else "simple")
+    extra.setdefault("splitter", transformations_config(transformations))
+    write_manifest(persist_dir, json_path, **extra)
+
+
+def get_stored_recipe_hashes(index: VectorStoreIndex) -> Dict[str, Tuple[str, Optional[str]]]:
+    """recipe_name -> (ref_doc_id, doc_hash)"""
+    docstore = index.docstore
+    stored = {}
+    for ref_doc_id, info in (docstore.get_all_ref_doc_info() or {}).items():
+        name = info.metadata.get("recipe_name")
+        if name is not None:
+            stored[name] = (ref_doc_id, docstore.get_document_hash(ref_doc_id))
+    return stored
+
+
+# 增量更新：按文档哈希比对，只对新增/修改的菜谱重新处理和嵌入，并删除已移除菜谱的节点
+def refresh_index(index: VectorStoreIndex, recipe_data: Union[Dict, Iterable[Tuple[str, Dict]]], transformations: Optional[list] = None,
+                  extractors: Optional[list] = None, embed_batch_size: int = 32, embed_concurrency: int = 4,
+                  metadata_mode: str = "llm") -> Dict[str, list]:
+    stored = get_stored_recipe_hashes(index)
+    recipe_store = get_recipe_store(index)
+    ingredient_index = get_ingredient_index(index)
+    keyword_index = get_keyword_index(index)
+
+    def delete_recipe(name: str, ref_doc_id: str) -> None:
+        ref_doc_info = index.docstore.get_ref_doc_info(ref_doc_id)
+        if ref_doc_info is not None:
+            keyword_index.remove_many(ref_doc_info.node_ids)
+        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        ingredient_index.remove(name)
+
+    added, updated, to_insert = [], [], []
+    seen = set()
+    # on_record 在对应 Document 产出之前调用，这里只保留当前这条，比对后再决定是否写入记录表
+    current = {}
+
+    def scan() -> Iterable[str]:
+        # 流式比对哈希，只保留新增/修改的文档；产出每篇文档的文本供 TF-IDF 在同一次遍历中拟合
+        for doc in iter_documents(recipe_data, on_record=lambda record: current.update(record=record)):
+            name = doc.metadata["recipe_name"]
+            seen.add(name)
+            changed = name not in stored or stored[name][1] != doc.hash
+            if changed:
+                if name in stored:
+                    delete_recipe(name, stored[name][0])
+                    updated.append(name)
+                else:
+                    added.append(name)
+                to_insert.append(doc)
+                recipe_store.add(current["record"])
+            yield doc.text
+
+    if metadata_mode == "tfidf" and extractors is None:
+        # IDF 需要在整个语料上拟合，而不仅是本次变化的菜谱
+        extractors = [TfidfMetadataExtractor(corpus=scan())]
+    else:
+        for _ in scan():
+            pass
+    recipe_store.flush()
+
+    removed = [name for name in stored if name not in seen]
+    for name in removed:
+        delete_recipe(name, stored[name][0])
+        recipe_store.delete(name)
+
+    if to_insert:
+        nodes = run_ingestion(to_insert, transformations, extractors, metadata_mode=metadata_mode)
+        embed_nodes_concurrently(nodes, batch_size=embed_batch_size, concurrency=embed_concurrency)
+        index.insert_nodes(nodes)
+        keyword_index.add_nodes(nodes)
+        index.docstore.set_document_hashes({doc.id_: doc.hash for doc in to_insert})
+        for doc in to_insert:
+            ingredient_index.add(doc.metadata["recipe_name"], doc.text)
+
+    invalidate_recipe_vectors(index)
+    invalidate_bm25_index(index)
+    invalidate_name_index(index)
+    invalidate_answer_cache(index)
+    knn_graph = get_knn_graph(index, build=False)
+    if knn_graph is not None and (added or updated or removed):
+        knn_graph.update(get_recipe_vectors(index), added + updated)
+    print(f"[INFO] 增量更新完成：新增 {len(added)}，修改 {len(updated)}，删除 {len(removed)}")
+    return {"added": added, "updated": updated, "removed": removed}
+
+
+# 流式读取菜谱文件并分批构建索引，峰值内存不随语料规模增长
+def build_index_from_file(json_path: str, batch_size: int = 256, metadata_mode: str = "llm",
+                          vector_store: str = "mmap", docstore: str = "sqlite",
+                          persist_dir: str = DEFAULT_PERSIST_DIR, **kwargs) -> VectorStoreIndex:
+    extractors = kwargs.pop("extractors", None)
+    if metadata_mode == "tfidf" and extractors is None:
+        # 先流式扫一遍语料拟合 IDF，再分批抽取关键词
+        corpus = (doc.text for batch in iter_document_batches(json_path, batch_size) for doc in batch)
+        extractors = [TfidfMetadataExtractor(corpus=corpus)]
+    # 文档和结构化菜谱记录在同一次解析中生成，记录直接写入 persist_dir 下的记录表；
+    # 清空记录表前先作废清单，构建中途失败时旧清单不会再指向被清空的记录表
+    invalidate_manifest(persist_dir)
+    recipe_store = RecipeStore.from_persist_dir(persist_dir, reset=True)
+    index = build_index_from_batches(iter_document_batches(json_path, batch_size, on_record=recipe_store.add),
+                                     extractors=extractors, metadata_mode=metadata_mode,
+                                     vector_store=make_vector_store(vector_store),
+                                     docstore=make_docstore(docstore, persist_dir), **kwargs)
+    recipe_store.flush()
+    attach_recipe_store(index, recipe_store)
+    return index
+
+
+# 为 mmap 向量存储训练 IVF 近似最近邻索引；nprobe 越大召回越高，可在运行时通过 vector_store.ann.nprobe 调整
+def build_ann_index(index: VectorStoreIndex, nlist: Optional[int] = None, nprobe: int = 8) -> None:
+    if not isinstance(index.vector_store, MmapVectorStore):
+        raise ValueError("ANN index requires the mmap vector store")
+    start = time.perf_counter()
+    ann = index.vector_store.build_ann(nlist=nlist, nprobe=nprobe)
+    print(f"[INFO] IVF 索引训练完成：{ann.nlist} 个簇，nprobe={ann.nprobe}，用时 {time.perf_counter() - start:.2f}s")
+
+
+# 优先加载已持久化的索引；源数据变化时做增量更新，嵌入模型变化或无法加载时才完整重建
+def load_or_build_index(json_path: str, persist_dir: str = DEFAULT_PERSIST_DIR, force_rebuild: bool = False,
+                        incremental: bool = True, metadata_mode: str = "llm",
+                        vector_store: str = "mmap", docstore: str = "sqlite", ann: bool = False,
+                        nlist: Optional[int] = None, nprobe: int = 8,
+                        transformations: Optional[list] = None) -> VectorStoreIndex:
+    manifest = None if force_rebuild else read_manifest(persist_dir)
+    if manifest is not None and manifest_matches(manifest, transformations=transformations):
+        try:
+            index = load_index(persist_dir)
+        except Exception as e:
+            print(f"[WARN] 加载持久化索引失败，将重新构建: {e}")
+        else:
+            if manifest.get("source_sha256") == file_sha256(json_path):
+                print(f"[INFO] 已从 {persist_dir} 加载持久化索引")
+                return index
+            if incremental:
+                print(f"[INFO] {json_path} 已变化，对 {persist_dir} 中的索引做增量更新")
+                mode = manifest.get("metadata_mode", metadata_mode)
+                # SQLite docstore 在更新过程中直接写盘
+                invalidate_manifest(persist_dir)
+                refresh_index(index, iter_recipes(json_path), transformations=transformations, metadata_mode=mode)
+                if ann:
+                    build_ann_index(index, nlist=nlist, nprobe=nprobe)
+                persist_index(index, json_path, persist_dir, transformations=transformations, metadata_mode=mode)
+                return index
+    print(f"[INFO] {persist_dir} 中的索引与 {json_path}、嵌入模型或切分配置不匹配，重新构建")
+
+    index = build_index_from_file(json_path, metadata_mode=metadata_mode, vector_store=vector_store,
+                                  docstore=docstore, persist_dir=persist_dir, transformations=transformations)
+    if ann:
+        build_ann_index(index, nlist=nlist, nprobe=nprobe)
+    persist_index(index, json_path, persist_dir, transformations=transformations, metadata_mode=metadata_mode)
+    return index
@@ -0,0 +1,37 @@
+# core/streaming.py
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from llama_index.core.schema import NodeWithScore
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """一条 Server-Sent Events 消息；data 序列化为单行 JSON"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def describe_sources(source_nodes: Iterable[NodeWithScore]) -> List[Dict]:
+    return [
+        {
+            "recipe_name": source.node.metadata.get("recipe_name"),
+            "node_id": source.node.node_id,
+            "score": source.score,
+        }
+        for source in source_nodes
+    ]
+
+
+def sse_stream(tokens: Iterable[str], final: Dict) -> Iterator[str]:
+    """逐个发送 token 事件，结束时发送带元数据（intent、sources 等）的 done 事件；生成过程出错时发送 error 事件"""
+    try:
+        for token in tokens:
+            if token:
+                yield sse_event({"token": token}, event="token")
+    except Exception as e:
+        print(f"[WARN] 流式生成中断: {e}")
+        yield sse_event({**final, "error": str(e)}, event="error")
+        return
+    yield sse_event(final, event="done")
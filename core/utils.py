@@ -1,6 +1,7 @@
 # core/utils.py
 from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.llms.ollama import Ollama
+from core.llm_cache import cached_complete, get_llm
+from core.ingredient_extractor import get_ingredient_extractor
 from fractions import Fraction
 import re
 
@@ -15,18 +16,23 @@ def get_last_mentioned_recipe(memory: ChatMemoryBuffer) -> str:
     return None
 
 
-# 用 Ollama 模型提取关键词（最多3个关键词）
+# 提取关键词（最多3个关键词）：先用食材词表自动机确定性匹配，一个食材都没匹配到时才调用 Ollama 模型
 def get_keywords_from_llama(query: str, model="tinyllama:1.1b") -> list:
     import re
 
-    llm = Ollama(model=model, request_timeout=600.0)
+    ingredients = get_ingredient_extractor().extract(query)
+    if ingredients:
+        print("[DEBUG] Matched ingredients:", ingredients)
+        return ingredients[:3]
+
+    llm = get_llm(model, request_timeout=600.0)
 
     system_prompt = (
         f"Extract at most 3 keywords from this input: \"{query}\"\n"
         f"Return in this format: Keywords: keyword1, keyword2, keyword3"
     )
 
-    response = llm.complete(system_prompt).text.strip()
+    response = cached_complete(system_prompt, llm=llm)
     print("[DEBUG] Raw response:", response)
 
     # 提取关键词部分
@@ -0,0 +1,216 @@
+# core/vector_store.py
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+from core.ann import IVFIndex
+
+VECTORS_FILE = "mmap_vectors.npy"
+IDS_FILE = "mmap_vectors_ids.json"
+ANN_FILE = "ivf_index.npz"
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """向量保存在连续的 float32 .npy 文件中，加载时直接 mmap，查询是一次矩阵-向量乘法。
+
+    id 表（节点 id、ref_doc_id、元数据）单独存为 JSON，元数据用于与 SimpleVectorStore 相同的过滤语义。
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    _matrix: np.ndarray = PrivateAttr()
+    _norms: Optional[np.ndarray] = PrivateAttr(default=None)
+    _ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr()
+    _metadata: List[Dict[str, Any]] = PrivateAttr()
+    _id_to_row: Dict[str, int] = PrivateAttr()
+    # 尚未并入 _matrix 的新增向量，每次 add 一个 (n, dim) float32 块
+    _pending: List[np.ndarray] = PrivateAttr()
+    _ann: Optional[IVFIndex] = PrivateAttr(default=None)
+
+    def __init__(self, matrix: Optional[np.ndarray] = None, ids: Optional[List[str]] = None,
+                 ref_doc_ids: Optional[List[Optional[str]]] = None,
+                 metadata: Optional[List[Dict[str, Any]]] = None, ann: Optional[IVFIndex] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self._ids = list(ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [None] * len(self._ids))
+        self._metadata = list(metadata or [{} for _ in self._ids])
+        self._id_to_row = {node_id: i for i, node_id in enumerate(self._ids)}
+        self._pending = []
+        self._ann = ann
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def node_ids(self) -> List[str]:
+        return self._ids
+
+    @property
+    def node_metadata(self) -> List[Dict[str, Any]]:
+        return self._metadata
+
+    @property
+    def ann(self) -> Optional[IVFIndex]:
+        return self._ann
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """所有向量组成的 (N, dim) float32 矩阵，行顺序与 node_ids 一致"""
+        if self._pending:
+            pending = np.concatenate(self._pending, axis=0)
+            self._matrix = pending if self._matrix.size == 0 else np.vstack([self._matrix, pending])
+            self._pending = []
+            self._norms = None
+            if self._ann is not None:
+                # 新增向量直接归入最近的簇，增量插入不需要重新训练
+                self._ann.add(pending)
+        return self._matrix
+
+    def build_ann(self, nlist: Optional[int] = None, nprobe: int = 8, n_iter: int = 20) -> IVFIndex:
+        """在当前全部向量上训练 IVF 近似最近邻索引，之后无过滤条件的查询只扫描 nprobe 个簇"""
+        self._ann = IVFIndex(nlist=nlist, nprobe=nprobe).train(self.matrix, n_iter=n_iter)
+        return self._ann
+
+    @property
+    def norms(self) -> np.ndarray:
+        if self._norms is None:
+            self._norms = np.linalg.norm(self.matrix, axis=1)
+        return self._norms
+
+    def get(self, text_id: str) -> List[float]:
+        return self.matrix[self._id_to_row[text_id]].tolist()
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        for node in nodes:
+            if node.node_id in self._id_to_row:
+                raise ValueError(f"Node {node.node_id} already exists in MmapVectorStore")
+        # 整批一次转成 float32 块再暂存，避免保留 Python float 列表（内存约为 float32 的 8 倍）
+        chunk = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        for node in nodes:
+            self._id_to_row[node.node_id] = len(self._ids)
+            self._ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+            self._metadata.append(dict(node.metadata))
+        self._pending.append(chunk)
+        return [node.node_id for node in nodes]
+
+    def _keep_rows(self, keep: np.ndarray) -> None:
+        matrix = self.matrix
+        # 删除后复制成普通数组，不再指向原 mmap 文件
+        self._matrix = np.ascontiguousarray(matrix[keep])
+        self._norms = None
+        rows = np.flatnonzero(keep)
+        self._ids = [self._ids[i] for i in rows]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in rows]
+        self._metadata = [self._metadata[i] for i in rows]
+        self._id_to_row = {node_id: i for i, node_id in enumerate(self._ids)}
+        if self._ann is not None:
+            self._ann.keep_rows(keep)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        keep = np.array([r != ref_doc_id for r in self._ref_doc_ids], dtype=bool)
+        if not keep.all():
+            self._keep_rows(keep)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        drop = set(node_ids or [])
+        keep = np.array([node_id not in drop for node_id in self._ids], dtype=bool)
+        if not keep.all():
+            self._keep_rows(keep)
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """根据 node_ids 和元数据过滤得到候选行；None 表示全部行"""
+        rows = None
+        if query.node_ids is not None:
+            rows = np.array(sorted(self._id_to_row[i] for i in query.node_ids if i in self._id_to_row), dtype=np.int64)
+        if query.filters is not None and query.filters.filters:
+            filter_fn = _build_metadata_filter_fn(lambda row: self._metadata[row], query.filters)
+            candidates = rows if rows is not None else range(len(self._ids))
+            rows = np.array([r for r in candidates if filter_fn(r)], dtype=np.int64)
+        return rows
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"MmapVectorStore only supports the default query mode, got {query.mode}")
+        if not self._ids:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        rows = self._candidate_rows(query)
+        matrix, norms = self.matrix, self.norms
+        if rows is None and self._ann is not None:
+            ann_rows, ann_scores = self._ann.search(matrix, norms, q, query.similarity_top_k)
+            return VectorStoreQueryResult(
+                nodes=None,
+                similarities=ann_scores.tolist(),
+                ids=[self._ids[r] for r in ann_rows],
+            )
+        if rows is not None:
+            matrix, norms = matrix[rows], norms[rows]
+        if matrix.shape[0] == 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        scores = (matrix @ q) / np.maximum(norms * np.linalg.norm(q), 1e-12)
+        k = min(query.similarity_top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        result_rows = rows[top] if rows is not None else top
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=scores[top].tolist(),
+            ids=[self._ids[r] for r in result_rows],
+        )
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        # StorageContext 传入的是 <persist_dir>/default__vector_store.json，这里只取目录
+        persist_dir = os.path.dirname(persist_path) or "."
+        os.makedirs(persist_dir, exist_ok=True)
+        # 先写临时文件再原子替换，正在 mmap 旧文件的进程不受影响
+        tmp_path = os.path.join(persist_dir, VECTORS_FILE + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        os.replace(tmp_path, os.path.join(persist_dir, VECTORS_FILE))
+        with open(os.path.join(persist_dir, IDS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"ids": self._ids, "ref_doc_ids": self._ref_doc_ids, "metadata": self._metadata},
+                      f, ensure_ascii=False)
+        ann_path = os.path.join(persist_dir, ANN_FILE)
+        if self._ann is not None:
+            self._ann.save(ann_path)
+        elif os.path.exists(ann_path):
+            os.remove(ann_path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MmapVectorStore":
+        matrix = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode='r')
+        with open(os.path.join(persist_dir, IDS_FILE), 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        ann_path = os.path.join(persist_dir, ANN_FILE)
+        ann = IVFIndex.load(ann_path) if os.path.exists(ann_path) else None
+        return cls(matrix=matrix, ids=table["ids"], ref_doc_ids=table["ref_doc_ids"], metadata=table["metadata"],
+                   ann=ann)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, VECTORS_FILE))
@@ -1,52 +1,102 @@
-import json
+import argparse
 import time
-from tqdm import tqdm
-from llama_index.core import Settings, VectorStoreIndex, StorageContext
+from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
-from core.prepare import prepare_documents
 from core.embedding import get_embed_model
+from core.loader import iter_recipes
+from core.storage import (persist_index, load_index, read_manifest, refresh_index, manifest_matches,
+                          invalidate_manifest, build_index_from_file, build_ann_index, make_vector_store, make_docstore)
+from core.sharding import build_index_sharded
 
-# 初始化模型
-print("Initializing models...")
-Settings.llm = Ollama(model="qwen:7b", request_timeout=600.0)
-Settings.embed_model = get_embed_model("nomic-embed-text")
-Settings.chunk_size = 1024
-
-# 加载数据
-print("Loading recipe data...")
-with open("data/recipe.json", 'r', encoding='utf-8') as f:
-    recipe_data = json.load(f)
-print(f"Loaded {len(recipe_data)} recipes")
-
-# 准备文档并构建索引
-print("Preparing documents...")
-# 使用tqdm显示文档准备的进度
-documents = []
-with tqdm(total=len(recipe_data), desc="Processing recipes") as pbar:
-    for i, (name, details) in enumerate(recipe_data.items()):
-        doc = prepare_documents({name: details})[0]  # 一次处理一个食谱
-        documents.append(doc)
-        pbar.update(1)
-        
-        # 每处理10个食谱显示一次进度
-        if (i+1) % 100 == 0:
-            print(f"Processed {i+1}/{len(recipe_data)} recipes")
-
-# 创建并保存索引
-print("\nBuilding index (this may take a while)...")
-# 标记开始时间
-start_time = time.time()
-
-# 使用LlamaIndex构建索引
-print("Vectorizing documents and building index structure...")
-index = VectorStoreIndex.from_documents(documents)
-
-# 显示完成时间
-elapsed = time.time() - start_time
-print(f"Index built in {elapsed:.2f} seconds")
-
-# 保存索引到磁盘
-print("Saving index to disk...")
-index.storage_context.persist("./data/index_storage")
-
-print("Index generated and saved successfully!")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the recipe index")
+    parser.add_argument("--source", default="data/recipe.json", help="菜谱数据文件（.json 或 .jsonl）")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批处理的菜谱数，决定构建时的峰值内存")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只重新嵌入新增/修改的菜谱，并删除已移除的菜谱")
+    parser.add_argument("--metadata", choices=["none", "tfidf", "llm"], default=None,
+                        help="节点元数据（标题/关键词）的抽取方式：不抽取、TF-IDF 或 LLM；"
+                             "默认沿用已有索引的方式，没有索引时为 none")
+    parser.add_argument("--vector-store", choices=["mmap", "simple"], default="mmap",
+                        help="向量存储格式：float32 内存映射文件或 llama_index 默认的 JSON")
+    parser.add_argument("--docstore", choices=["sqlite", "simple"], default="sqlite",
+                        help="节点存储格式：SQLite 单文件（按需读取节点文本）或 llama_index 默认的 JSON")
+    parser.add_argument("--ann", action="store_true", help="额外训练 IVF 近似最近邻索引（仅 mmap 向量存储）")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF 簇数，默认约 4*sqrt(N)")
+    parser.add_argument("--nprobe", type=int, default=8, help="查询时扫描的簇数，越大召回越高")
+    parser.add_argument("--shards", type=int, default=1, help="分片数（进程数），大于 1 时启用多进程分片构建")
+    parser.add_argument("--embed-url", action="append", dest="embed_urls",
+                        help="Ollama 嵌入服务地址，可重复指定，分片轮流使用")
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="每个嵌入请求批次包含的节点数")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="同时在途的嵌入批次数")
+    args = parser.parse_args()
+
+    # 初始化模型
+    print("Initializing models...")
+    Settings.llm = Ollama(model="qwen:7b", request_timeout=600.0)
+    Settings.embed_model = get_embed_model("nomic-embed-text")
+    Settings.chunk_size = 1024
+
+    # 增量模式：与已持久化索引中的文档哈希比对，只处理变化的菜谱；嵌入模型、切分配置或元数据抽取方式变了则完整重建
+    manifest = read_manifest("./data/index_storage")
+    stored_mode = manifest.get("metadata_mode") if manifest else None
+    metadata_mode = args.metadata or stored_mode or "none"
+    if (args.incremental and manifest and manifest_matches(manifest, transformations=Settings.transformations)
+            and stored_mode == metadata_mode):
+        print("Refreshing existing index incrementally...")
+        start_time = time.time()
+        index = load_index("./data/index_storage")
+        # SQLite docstore 在更新过程中直接写盘，中途失败时不能留下旧清单
+        invalidate_manifest("./data/index_storage")
+        refresh_index(index, iter_recipes(args.source), transformations=Settings.transformations, metadata_mode=metadata_mode,
+                      embed_batch_size=args.embed_batch_size, embed_concurrency=args.embed_concurrency)
+        if args.ann:
+            # 已有的 IVF 索引会随增量插入/删除维护，但簇中心不变；指定 --ann 时在更新后的向量上重新训练
+            build_ann_index(index, nlist=args.nlist, nprobe=args.nprobe)
+        print(f"Index refreshed in {time.time() - start_time:.2f} seconds")
+        persist_index(index, args.source, "./data/index_storage", transformations=Settings.transformations,
+                      metadata_mode=metadata_mode)
+        print("Index refreshed and saved successfully!")
+        return
+
+    # 创建并保存索引
+    print("\nBuilding index (this may take a while)...")
+    # 标记开始时间
+    start_time = time.time()
+
+    if args.shards > 1:
+        # 多进程分片构建：每个进程负责一部分菜谱的准备、切分和嵌入，最后合并成一个索引
+        print(f"Building {args.shards} shards in parallel...")
+        index = build_index_sharded(args.source, args.shards, embed_base_urls=args.embed_urls,
+                                    metadata_mode=metadata_mode, batch_size=args.batch_size,
+                                    embed_batch_size=args.embed_batch_size, embed_concurrency=args.embed_concurrency,
+                                    chunk_size=Settings.chunk_size, chunk_overlap=Settings.chunk_overlap,
+                                    vector_store=make_vector_store(args.vector_store),
+                                    docstore=make_docstore(args.docstore, "./data/index_storage"))
+    else:
+        # 流式读取菜谱并分批处理：每批文档切分、嵌入（按批并发请求 Ollama）后立即写入索引
+        print(f"Streaming recipes from {args.source} in batches of {args.batch_size}...")
+        index = build_index_from_file(args.source, batch_size=args.batch_size, transformations=Settings.transformations,
+                                      metadata_mode=metadata_mode, vector_store=args.vector_store, docstore=args.docstore,
+                                      persist_dir="./data/index_storage", embed_batch_size=args.embed_batch_size,
+                                      embed_concurrency=args.embed_concurrency)
+
+    if args.ann:
+        build_ann_index(index, nlist=args.nlist, nprobe=args.nprobe)
+
+    # 显示完成时间
+    elapsed = time.time() - start_time
+    print(f"Index built in {elapsed:.2f} seconds")
+
+    # 保存索引到磁盘
+    print("Saving index to disk...")
+    # 同时写入索引清单（源数据哈希 + 嵌入模型），应用启动时据此判断能否直接加载
+    persist_index(index, args.source, "./data/index_storage", transformations=Settings.transformations,
+                  metadata_mode=metadata_mode)
+
+    print("Index generated and saved successfully!")
+
+
+if __name__ == "__main__":
+    main()
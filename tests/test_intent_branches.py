@@ -0,0 +1,87 @@
+# tests/test_intent_branches.py
+# 命中意图提示的查询必须能被对应分支解析：相似意图取得目标菜名，缩放意图取得倍数
+import os
+import shutil
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import ChatMessage, MockLLM
+from llama_index.core.memory import ChatMemoryBuffer
+
+from core.intent import SCALE_CUES, SIMILAR_CUES, IntentClassifier, cue_target, scale_factor
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    from core.storage import load_or_build_index
+
+    Settings.llm = MockLLM(max_tokens=8)
+    Settings.embed_model = MockEmbedding(embed_dim=16)
+    workdir = tmp_path_factory.mktemp("index")
+    src = str(workdir / "sample.json")
+    shutil.copy(os.path.join(ROOT, "sample.json"), src)
+    return load_or_build_index(src, persist_dir=str(workdir / "storage"), metadata_mode="none")
+
+
+@pytest.fixture(scope="module")
+def smart_chat():
+    from core import smart_chat
+    return smart_chat
+
+
+def cue_label(query):
+    return IntentClassifier({"chat": ["hello"]}, cues={"similar": SIMILAR_CUES, "scale": SCALE_CUES}).match_cue(query)
+
+
+@pytest.mark.parametrize("query, target", [
+    ("show me dishes like soy sauce", "soy sauce"),
+    ("Any recipes similar to Olive Oil?", "Olive Oil"),
+    ("similar dishes to soy sauce please", "soy sauce please"),
+    ("和红烧肉类似的菜", "红烧肉"),
+    ("跟宫保鸡丁差不多的菜谱", "宫保鸡丁"),
+    ("类似麻婆豆腐的做法", "麻婆豆腐"),
+])
+def test_similar_cues_yield_target(query, target):
+    assert cue_label(query) == "similar"
+    assert cue_target(query) == target
+
+
+@pytest.mark.parametrize("query, factor", [
+    ("把份量减半", 0.5),
+    ("这个菜谱加倍", 2.0),
+    ("double the recipe", 2.0),
+    ("halve this please", 0.5),
+    ("triple it", 3.0),
+    ("scale to 6 servings", 6.0),
+    ("make it for 4 people", 4.0),
+    ("改成3人份", 3.0),
+])
+def test_scale_cues_yield_factor(query, factor):
+    assert cue_label(query) == "scale"
+    assert scale_factor(query) == factor
+
+
+def test_similar_branch_resolves_target(index, smart_chat):
+    from core.query import similar_recipes
+
+    reply = smart_chat.smart_chat_turn("show me dishes like soy sauce", SimpleNamespace(), index)
+    expected = similar_recipes("soy sauce", index)
+    assert expected
+    assert reply == "Here are some dishes similar to what you mentioned:\n" + "\n".join(
+        f"- {name} (similarity: {score:.2f})" for name, score in expected
+    )
+
+
+@pytest.mark.parametrize("query, expected", [("把份量减半", "0.5x"), ("double the recipe", "2x")])
+def test_scale_branch_scales_last_recipe(index, smart_chat, query, expected):
+    memory = ChatMemoryBuffer.from_defaults()
+    memory.put(ChatMessage(role="assistant", content="...", additional_kwargs={"recipe_name": "chicken"}))
+    reply = smart_chat.smart_chat_turn(query, SimpleNamespace(memory=memory), index)
+    assert f"adjusted ingredients for {expected} servings" in reply
@@ -1,15 +1,12 @@
 # vision3.py
 import streamlit as st
-import json
-import re
 import nest_asyncio
 from datetime import datetime
-from typing import Dict, Any, Optional, List
-from core.prepare import prepare_documents, build_index
-from core.query import init_chat_engine, query_answer, chat_turn
+from typing import Dict, Any
+from core.storage import load_or_build_index
+from core.query import init_chat_engine
 from core.smart_chat import smart_chat_turn, classify_query
 from core.embedding import get_embed_model
-from core.utils import scale_ingredients, get_keywords_from_llama, extract_number_from_text
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
 
@@ -73,27 +70,9 @@ def initialize_system():
             Settings.embed_model = get_embed_model("nomic-embed-text")
             Settings.chunk_size = 1024
             
-            # 检查是否存在预生成的索引
-            import os
-            if os.path.exists("./data/index_storage"):
-                # 加载预生成的索引
-                from llama_index.core import StorageContext, load_index_from_storage
-                
-                st.info("Loading pre-built index...")
-                storage_context = StorageContext.from_defaults(
-                    persist_dir="./data/index_storage"
-                )
-                st.session_state.index = load_index_from_storage(storage_context)
-                st.session_state.chat_engine = init_chat_engine(st.session_state.index)
-            else:
-                # 如果没有预生成的索引，则即时构建
-                st.warning("No pre-built index found. Building index on-the-fly...")
-                with open("data/recipe.json", 'r', encoding='utf-8') as f:
-                    recipe_data = json.load(f)
-                
-                documents = prepare_documents(recipe_data)
-                st.session_state.index = build_index(documents)
-                st.session_state.chat_engine = init_chat_engine(st.session_state.index)
+            # 加载预生成的索引；索引与数据或嵌入模型不匹配时才即时重建
+            st.session_state.index = load_or_build_index("data/recipe.json", persist_dir="./data/index_storage")
+            st.session_state.chat_engine = init_chat_engine(st.session_state.index)
 
             st.session_state.system_initialized = True
             st.rerun()
@@ -1,15 +1,14 @@
 # vision3.py
 import streamlit as st
 import re
-import json
 import nest_asyncio
 from datetime import datetime
 from typing import Dict, Any, Optional
-from core.prepare import prepare_documents, build_index
+from core.storage import load_or_build_index
 from core.query import init_chat_engine, suggest_recipes_by_ingredients, find_similar_recipes
-from core.smart_chat import smart_chat_turn  # 新增智能聊天模块
 from core.embedding import get_embed_model
 from core.utils import scale_ingredients, get_keywords_from_llama
+from core.recipes import get_recipe_record
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
 
@@ -57,18 +56,13 @@ def apply_custom_style():
 def initialize_system():
     if "system_initialized" not in st.session_state:
         with st.spinner("🚀 正在初始化智能食谱系统..."):
-            # 从main.py整合初始化逻辑
-            with open("sample.json", 'r', encoding='utf-8') as f:
-                recipe_data = json.load(f)
-
             # 严格使用core模块配置
             Settings.llm = Ollama(model="qwen:7b", request_timeout=600.0)
             Settings.embed_model = get_embed_model("nomic-embed-text")
             Settings.chunk_size = 1024
 
-            # 使用core.prepare构建索引
-            documents = prepare_documents(recipe_data)
-            st.session_state.index = build_index(documents)
+            # 优先加载持久化索引，数据或模型变化时才重建
+            st.session_state.index = load_or_build_index("sample.json", persist_dir="./data/sample_index_storage")
             
             # 初始化聊天引擎（来自core.query）
             st.session_state.chat_engine = init_chat_engine(st.session_state.index)
@@ -76,7 +70,12 @@ def initialize_system():
             st.session_state.system_initialized = True
 
 # 解析食谱数据（复用prepare.py逻辑）
-def parse_recipe_data(node_text: str) -> Dict[str, Any]:
+def parse_recipe_data(node_text: str, recipe_name: Optional[str] = None) -> Dict[str, Any]:
+    # 已知菜谱名时直接读取索引时保存的结构化记录，不再逐次用正则解析
+    if recipe_name is not None:
+        record = get_recipe_record(st.session_state.index, recipe_name)
+        if record:
+            return record
     try:
         # 从原始文本解析元数据
         return {